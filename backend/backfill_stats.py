@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+One-off backfill of the contact_stats rollups from contact_messages.
+
+    python backfill_stats.py
+
+Run it once after deploying the rollups, or whenever they drift. It
+rewrites the rollups of every day still in contact_messages, so
+submissions that land while it runs may be missed; run it during a quiet
+period. Days already moved to the cold archive keep their counts.
+"""
+
+import asyncio
+import os
+
+import contact_stats
+import server
+
+
+async def main():
+    client = server.create_mongo_client()
+    try:
+        db = client[os.environ['DB_NAME']]
+        await contact_stats.rebuild(db.contact_messages)
+        summary = await contact_stats.summarise(db[contact_stats.STATS_COLLECTION])
+        print(f"Rebuilt {len(summary['by_day'])} days / {len(summary['by_project'])} projects, {summary['total']} messages")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
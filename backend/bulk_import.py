@@ -0,0 +1,130 @@
+import re
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+import orjson
+
+# Bytes that can change the splitter's state; everything else is skipped by the regex
+_STRUCTURAL = re.compile(rb'[\[\]{}",\\]')
+_WHITESPACE = b" \t\r\n"
+
+Record = Tuple[int, Union[object, ValueError]]
+
+
+class JSONArraySplitter:
+    """Incrementally cuts a top-level JSON array into its element byte strings.
+
+    Only nesting depth and string state are tracked, so elements are never
+    parsed here; each one is handed to orjson separately. This keeps memory
+    bounded by the largest single element rather than the whole body.
+    A trailing comma or anything but whitespace after the closing bracket
+    raises ValueError, after the elements before it have been handed out.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.pos = 0
+        self.start = 0
+        self.depth = 0
+        self.in_string = False
+        self.opened = False
+        self.closed = False
+        self.after_comma = False
+        self.error: Optional[str] = None
+
+    def feed(self, data: bytes) -> List[bytes]:
+        if self.closed:
+            if data.strip(_WHITESPACE):
+                raise ValueError("Unexpected data after the JSON array")
+            return []
+        self.buffer += data
+        if not self.opened:
+            stripped = self.buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                return []
+            if stripped[:1] != b"[":
+                raise ValueError("Body must be a JSON array or NDJSON")
+            self.opened = True
+            self.pos = self.start = len(self.buffer) - len(stripped) + 1
+        elements = []
+        while not self.closed:
+            match = _STRUCTURAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                break
+            i = match.start()
+            char = self.buffer[i]
+            if self.in_string:
+                if char == ord("\\"):
+                    if i + 1 >= len(self.buffer):
+                        # Escaped character not received yet
+                        self.pos = i
+                        break
+                    self.pos = i + 2
+                    continue
+                if char == ord('"'):
+                    self.in_string = False
+                self.pos = i + 1
+                continue
+            self.pos = i + 1
+            if char == ord('"'):
+                self.in_string = True
+            elif char in b"[{":
+                self.depth += 1
+            elif char in b"}]" and self.depth > 0:
+                self.depth -= 1
+            elif char in b",]" and self.depth == 0:
+                element = bytes(self.buffer[self.start:i]).strip(_WHITESPACE)
+                if char == ord("]") and not element and self.after_comma:
+                    self.error = "Trailing comma in JSON array"
+                elif element or char == ord(","):
+                    elements.append(element)
+                self.after_comma = char == ord(",")
+                self.start = i + 1
+                self.closed = char == ord("]")
+        if self.closed:
+            # Reported from finish() so the elements before it still go out
+            if self.error is None and self.buffer[self.start:].strip(_WHITESPACE):
+                self.error = "Unexpected data after the JSON array"
+            self.start = len(self.buffer)
+        # Drop everything already handed out
+        del self.buffer[:self.start]
+        self.pos -= self.start
+        self.start = 0
+        return elements
+
+    def finish(self):
+        if not self.closed:
+            raise ValueError("Unterminated JSON array")
+        if self.error is not None:
+            raise ValueError(self.error)
+
+
+def _parse(raw: bytes) -> Union[object, ValueError]:
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    index = 0
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield index, _parse(line)
+                index += 1
+    if pending.strip():
+        yield index, _parse(pending)
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    index = 0
+    splitter = JSONArraySplitter()
+    async for chunk in chunks:
+        for element in splitter.feed(chunk):
+            yield index, _parse(element)
+            index += 1
+    splitter.finish()
@@ -0,0 +1,119 @@
+import gzip
+import importlib.util
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import orjson
+
+# zstandard is only imported when a .zst partition is read or written
+HAVE_ZSTANDARD = importlib.util.find_spec("zstandard") is not None
+
+CODECS = (".ndjson.zst", ".ndjson.gz")
+
+
+def _parse(line: bytes) -> dict:
+    message = orjson.loads(line)
+    message["created_at"] = datetime.fromisoformat(message["created_at"])
+    return message
+
+
+class ColdArchive:
+    """Date-partitioned, compressed NDJSON files for messages past retention.
+
+    Each UTC day is one file, ``<root>/YYYY/MM/YYYY-MM-DD.ndjson.zst`` (or
+    ``.ndjson.gz`` without the zstandard package), holding that day's
+    messages in (created_at, id) order. Writing merges into the existing
+    partition and replaces it atomically, so re-archiving a message after an
+    interrupted sweep never duplicates it.
+    """
+
+    def __init__(self, root, zstd_level: int = 10, gzip_level: int = 9):
+        self.root = Path(root)
+        self.zstd_level = zstd_level
+        self.gzip_level = gzip_level
+        self.suffix = CODECS[0] if HAVE_ZSTANDARD else CODECS[1]
+
+    def _directory(self, day: date) -> Path:
+        return self.root / f"{day.year:04d}" / f"{day.month:02d}"
+
+    def partition(self, day: date) -> Optional[Path]:
+        for suffix in CODECS:
+            path = self._directory(day) / f"{day.isoformat()}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def days(self, since: Optional[date] = None, until: Optional[date] = None) -> List[date]:
+        found = set()
+        for suffix in CODECS:
+            for path in self.root.glob(f"*/*/*{suffix}"):
+                try:
+                    day = date.fromisoformat(path.name[:-len(suffix)])
+                except ValueError:
+                    continue
+                if (since is None or day >= since) and (until is None or day <= until):
+                    found.add(day)
+        return sorted(found)
+
+    def read_day(self, day: date) -> Iterator[dict]:
+        path = self.partition(day)
+        if path is None:
+            return
+        with self._open_read(path) as f:
+            for line in f:
+                if line.strip():
+                    yield _parse(line)
+
+    def write(self, day: date, messages: Iterable[dict]) -> Path:
+        merged = {message["id"]: message for message in self.read_day(day)}
+        merged.update((message["id"], message) for message in messages)
+        rows = sorted(merged.values(), key=lambda m: (m["created_at"], m["id"]))
+        directory = self._directory(day)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{day.isoformat()}{self.suffix}"
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{day.isoformat()}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, self._open_write(raw) as f:
+                for message in rows:
+                    f.write(orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        # A partition written by the other codec is now superseded
+        for suffix in CODECS:
+            stale = directory / f"{day.isoformat()}{suffix}"
+            if suffix != self.suffix and stale.exists():
+                stale.unlink()
+        return path
+
+    def scan(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        match: Optional[Callable[[dict], bool]] = None,
+    ) -> Iterator[dict]:
+        for day in self.days(since, until):
+            for message in self.read_day(day):
+                if match is None or match(message):
+                    yield message
+
+    def _open_read(self, path: Path):
+        if path.name.endswith(".zst"):
+            if not HAVE_ZSTANDARD:
+                raise RuntimeError(f"{path} needs the zstandard package")
+            import zstandard
+
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+        return gzip.open(path, "rb")
+
+    def _open_write(self, raw):
+        if self.suffix.endswith(".zst"):
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=self.zstd_level).stream_writer(raw, closefd=False)
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.gzip_level)
@@ -0,0 +1,373 @@
+import asyncio
+import bisect
+import logging
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+import contact_stats
+from text_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# Keyset pagination over (created_at, id), newest first
+CONTACT_SORT = [("created_at", -1), ("id", -1)]
+CONTACT_FIELDS = ["id", "name", "email", "project", "message", "created_at"]
+CONTACT_PROJECTION = {field: 1 for field in CONTACT_FIELDS} | {"_id": 0}
+CONTACT_TEXT_WEIGHTS = {"name": 3, "email": 3, "project": 2, "message": 1}
+
+
+def public_fields(document: dict) -> dict:
+    return {field: document[field] for field in CONTACT_FIELDS}
+
+
+class ContactRepository(ABC):
+    """All reads and writes of contact messages go through this interface.
+
+    Positions are the ``{"created_at", "id"}`` dicts decoded from cursors
+    (plus ``"score"`` for search). Returned messages carry CONTACT_FIELDS
+    only. Both engines raise pymongo's DuplicateKeyError and
+    BulkWriteError, so callers handle one set of write errors.
+    """
+
+    async def ensure_indexes(self):
+        pass
+
+    async def ping(self):
+        pass
+
+    @abstractmethod
+    async def insert(self, document: dict):
+        """Store one message; DuplicateKeyError if its id or idempotency_key exists."""
+
+    @abstractmethod
+    async def insert_many(self, documents: List[dict]):
+        """Unordered insert; BulkWriteError lists the indexes that were rejected."""
+
+    @abstractmethod
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def page(self, limit: int, after: Optional[dict] = None) -> List[dict]:
+        """Up to ``limit`` messages older than ``after``, newest first."""
+
+    @abstractmethod
+    async def latest(self) -> Tuple[Optional[datetime], int]:
+        """Newest created_at and the (possibly estimated) message count."""
+
+    @abstractmethod
+    def scan(self, since: Optional[datetime] = None, after: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Messages created at or after ``since`` / strictly after ``after``, oldest first."""
+
+    @abstractmethod
+    async def search(self, q: str, limit: int, after: Optional[dict] = None) -> List[dict]:
+        """Best matches for ``q`` with a ``score`` field, ordered by (score, created_at, id) descending."""
+
+    @abstractmethod
+    async def set_fields(self, message_id: str, fields: dict):
+        pass
+
+    @abstractmethod
+    async def expired(self, before: datetime, limit: int) -> List[dict]:
+        """Whole documents created before ``before``, oldest first, for archiving."""
+
+    @abstractmethod
+    async def delete(self, documents: List[dict]):
+        pass
+
+    @abstractmethod
+    async def pending_jobs(self, limit: int) -> List[dict]:
+        """Messages still carrying a ``pending_jobs`` list, oldest first."""
+
+    @abstractmethod
+    async def clear_pending_jobs(self, message_ids: List[str]):
+        pass
+
+    @abstractmethod
+    async def record_stats(self, documents: Iterable[dict]):
+        pass
+
+    @abstractmethod
+    async def stats(self, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+        pass
+
+
+class MotorContactRepository(ContactRepository):
+    """contact_messages and its rollups in MongoDB, through Motor."""
+
+    def __init__(self, db, batch_size: int = 500):
+        self.messages = db.contact_messages
+        self.rollups = db[contact_stats.STATS_COLLECTION]
+        self.batch_size = batch_size
+        # Full-text search: Mongo $text when available, in-process index otherwise
+        self.text_search_supported = True
+        self.fallback_index: Optional[InvertedIndex] = None
+        self.fallback_lock = asyncio.Lock()
+
+    async def ensure_indexes(self):
+        await self.messages.create_index(CONTACT_SORT, name="created_at_id")
+        await self.messages.create_index("id", unique=True, name="id_unique")
+        await self.messages.create_index(
+            "idempotency_key",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+            name="idempotency_key_unique",
+        )
+        # Only messages whose jobs have not been relayed yet are in this index
+        await self.messages.create_index(
+            "created_at",
+            partialFilterExpression={"pending_jobs": {"$exists": True}},
+            name="pending_jobs",
+        )
+        await self.ensure_text_index()
+
+    async def ensure_text_index(self):
+        try:
+            await self.messages.create_index(
+                [(field, "text") for field in CONTACT_TEXT_WEIGHTS],
+                weights=CONTACT_TEXT_WEIGHTS,
+                name="contact_text",
+            )
+            self.text_search_supported = True
+        except (OperationFailure, NotImplementedError) as e:
+            logger.warning("Text index unavailable, using in-process search index: %s", e)
+            self.text_search_supported = False
+
+    async def ping(self):
+        await self.messages.database.command("ping")
+
+    async def insert(self, document: dict):
+        await self.messages.insert_one(document)
+
+    async def insert_many(self, documents: List[dict]):
+        await self.messages.insert_many(documents, ordered=False)
+
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        return await self.messages.find_one({"idempotency_key": key}, CONTACT_PROJECTION)
+
+    async def page(self, limit: int, after: Optional[dict] = None) -> List[dict]:
+        query = {}
+        if after is not None:
+            query = {"$or": [
+                {"created_at": {"$lt": after["created_at"]}},
+                {"created_at": after["created_at"], "id": {"$lt": after["id"]}},
+            ]}
+        return await self.messages.find(query, CONTACT_PROJECTION).sort(CONTACT_SORT).limit(limit).to_list(limit)
+
+    async def latest(self) -> Tuple[Optional[datetime], int]:
+        # Two index/metadata lookups instead of the full query
+        newest, count = await asyncio.gather(
+            self.messages.find({}, {"created_at": 1, "_id": 0}).sort(CONTACT_SORT).limit(1).to_list(1),
+            self.messages.estimated_document_count(),
+        )
+        return (newest[0]["created_at"] if newest else None), count
+
+    async def scan(self, since: Optional[datetime] = None, after: Optional[dict] = None) -> AsyncIterator[dict]:
+        query = {}
+        if after is not None:
+            query = {"$or": [
+                {"created_at": {"$gt": after["created_at"]}},
+                {"created_at": after["created_at"], "id": {"$gt": after["id"]}},
+            ]}
+        elif since is not None:
+            query = {"created_at": {"$gte": since}}
+        cursor = self.messages.find(query, CONTACT_PROJECTION).sort([("created_at", 1), ("id", 1)])
+        async for message in cursor.batch_size(self.batch_size):
+            yield message
+
+    async def search(self, q: str, limit: int, after: Optional[dict] = None) -> List[dict]:
+        if self.text_search_supported:
+            try:
+                return await self._text_search(q, limit, after)
+            except (OperationFailure, NotImplementedError) as e:
+                logger.warning("Text search failed, switching to in-process search index: %s", e)
+                self.text_search_supported = False
+        return await self._fallback_search(q, limit, after)
+
+    async def _text_search(self, q: str, limit: int, after: Optional[dict]) -> List[dict]:
+        pipeline = [
+            {"$match": {"$text": {"$search": q}}},
+            {"$project": {**CONTACT_PROJECTION, "score": {"$meta": "textScore"}}},
+        ]
+        if after is not None:
+            score, created_at, message_id = after["score"], after["created_at"], after["id"]
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "created_at": {"$lt": created_at}},
+                {"score": score, "created_at": created_at, "id": {"$lt": message_id}},
+            ]}})
+        pipeline += [{"$sort": {"score": -1, "created_at": -1, "id": -1}}, {"$limit": limit}]
+        return await self.messages.aggregate(pipeline).to_list(limit)
+
+    async def _fallback_search(self, q: str, limit: int, after: Optional[dict]) -> List[dict]:
+        async with self.fallback_lock:
+            if self.fallback_index is None:
+                self.fallback_index = InvertedIndex(list(CONTACT_TEXT_WEIGHTS), CONTACT_TEXT_WEIGHTS)
+            await self.fallback_index.sync(self.messages)
+        position = (after["score"], after["created_at"], after["id"]) if after else None
+        keys = self.fallback_index.search(q, limit, position)
+        ids = [message_id for _, _, message_id in keys]
+        found = {m["id"]: m async for m in self.messages.find({"id": {"$in": ids}}, CONTACT_PROJECTION)}
+        return [found[message_id] | {"score": score} for score, _, message_id in keys if message_id in found]
+
+    async def set_fields(self, message_id: str, fields: dict):
+        await self.messages.update_one({"id": message_id}, {"$set": fields})
+
+    async def expired(self, before: datetime, limit: int) -> List[dict]:
+        cursor = self.messages.find({"created_at": {"$lt": before}}, {"_id": 0})
+        return await cursor.sort([("created_at", 1), ("id", 1)]).limit(limit).to_list(limit)
+
+    async def delete(self, documents: List[dict]):
+        await self.messages.delete_many({"id": {"$in": [document["id"] for document in documents]}})
+        async with self.fallback_lock:
+            if self.fallback_index is not None:
+                for document in documents:
+                    self.fallback_index.remove(document)
+
+    async def pending_jobs(self, limit: int) -> List[dict]:
+        cursor = self.messages.find({"pending_jobs": {"$exists": True}}, CONTACT_PROJECTION | {"pending_jobs": 1})
+        return await cursor.sort("created_at", 1).limit(limit).to_list(limit)
+
+    async def clear_pending_jobs(self, message_ids: List[str]):
+        await self.messages.update_many({"id": {"$in": message_ids}}, {"$unset": {"pending_jobs": ""}})
+
+    async def record_stats(self, documents: Iterable[dict]):
+        await contact_stats.record(self.rollups, documents)
+
+    async def stats(self, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+        return await contact_stats.summarise(self.rollups, since, until)
+
+
+class MemoryContactRepository(ContactRepository):
+    """In-process engine for benchmarks and for running without a Mongo server.
+
+    Documents are kept by id next to a list of (created_at, id) keys that
+    bisect keeps sorted, so pages, scans and retention batches are slices
+    of that index. Search uses InvertedIndex and stats keep the same
+    (day, project) rollups as Mongo. Nothing is persisted.
+    """
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.documents: Dict[str, dict] = {}
+        self.index: List[Tuple[datetime, str]] = []
+        self.idempotency_keys: Dict[str, str] = {}
+        # Ids of messages with unrelayed jobs, in insertion order
+        self.with_pending_jobs: Dict[str, None] = {}
+        self.text = InvertedIndex(list(CONTACT_TEXT_WEIGHTS), CONTACT_TEXT_WEIGHTS)
+        self.rollups: Counter = Counter()
+
+    def _add(self, document: dict):
+        message_id = document["id"]
+        key = document.get("idempotency_key")
+        if message_id in self.documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: id_unique dup key: {message_id}", 11000)
+        if key is not None and key in self.idempotency_keys:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: idempotency_key_unique dup key: {key}", 11000)
+        document = dict(document)
+        self.documents[message_id] = document
+        bisect.insort(self.index, (document["created_at"], message_id))
+        if key is not None:
+            self.idempotency_keys[key] = message_id
+        if "pending_jobs" in document:
+            self.with_pending_jobs[message_id] = None
+        self.text.add(document)
+
+    async def insert(self, document: dict):
+        self._add(document)
+
+    async def insert_many(self, documents: List[dict]):
+        errors = []
+        for index, document in enumerate(documents):
+            try:
+                self._add(document)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": e.code, "errmsg": str(e)})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        message_id = self.idempotency_keys.get(key)
+        return public_fields(self.documents[message_id]) if message_id is not None else None
+
+    async def page(self, limit: int, after: Optional[dict] = None) -> List[dict]:
+        end = len(self.index)
+        if after is not None:
+            end = bisect.bisect_left(self.index, (after["created_at"], after["id"]))
+        keys = self.index[max(0, end - limit):end]
+        return [public_fields(self.documents[message_id]) for _, message_id in reversed(keys)]
+
+    async def latest(self) -> Tuple[Optional[datetime], int]:
+        return (self.index[-1][0] if self.index else None), len(self.index)
+
+    async def scan(self, since: Optional[datetime] = None, after: Optional[dict] = None) -> AsyncIterator[dict]:
+        if after is not None:
+            start = bisect.bisect_right(self.index, (after["created_at"], after["id"]))
+        elif since is not None:
+            start = bisect.bisect_left(self.index, (since,))
+        else:
+            start = 0
+        while True:
+            keys = self.index[start:start + self.batch_size]
+            if not keys:
+                return
+            for _, message_id in keys:
+                document = self.documents.get(message_id)
+                if document is not None:
+                    yield public_fields(document)
+            # The index may change while the consumer awaits; resume after the last key
+            start = bisect.bisect_right(self.index, keys[-1])
+            await asyncio.sleep(0)
+
+    async def search(self, q: str, limit: int, after: Optional[dict] = None) -> List[dict]:
+        position = (after["score"], after["created_at"], after["id"]) if after else None
+        return [
+            public_fields(self.documents[message_id]) | {"score": score}
+            for score, _, message_id in self.text.search(q, limit, position)
+        ]
+
+    async def set_fields(self, message_id: str, fields: dict):
+        document = self.documents.get(message_id)
+        if document is not None:
+            document.update(fields)
+
+    async def expired(self, before: datetime, limit: int) -> List[dict]:
+        end = min(limit, bisect.bisect_left(self.index, (before,)))
+        return [dict(self.documents[message_id]) for _, message_id in self.index[:end]]
+
+    async def delete(self, documents: List[dict]):
+        for document in documents:
+            stored = self.documents.pop(document["id"], None)
+            if stored is None:
+                continue
+            position = bisect.bisect_left(self.index, (stored["created_at"], stored["id"]))
+            del self.index[position]
+            self.idempotency_keys.pop(stored.get("idempotency_key"), None)
+            self.with_pending_jobs.pop(stored["id"], None)
+            self.text.remove(stored)
+
+    async def pending_jobs(self, limit: int) -> List[dict]:
+        ids = list(self.with_pending_jobs)[:limit]
+        return [public_fields(self.documents[i]) | {"pending_jobs": self.documents[i]["pending_jobs"]} for i in ids]
+
+    async def clear_pending_jobs(self, message_ids: List[str]):
+        for message_id in message_ids:
+            if message_id in self.with_pending_jobs:
+                del self.with_pending_jobs[message_id]
+                self.documents[message_id].pop("pending_jobs", None)
+
+    async def record_stats(self, documents: Iterable[dict]):
+        for document in documents:
+            bucket = contact_stats.bucket_id(document)
+            self.rollups[(bucket["day"], bucket["project"])] += 1
+
+    async def stats(self, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+        return contact_stats.summarise_counts(
+            (day, project, count)
+            for (day, project), count in self.rollups.items()
+            if (since is None or day >= since.isoformat()) and (until is None or day <= until.isoformat())
+        )
@@ -0,0 +1,72 @@
+from collections import Counter
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+# One rollup document per (day, project): {"_id": {"day": "YYYY-MM-DD", "project": ...}, "count": n}
+STATS_COLLECTION = "contact_stats"
+
+
+def bucket_id(document: dict) -> dict:
+    return {"day": document["created_at"].strftime("%Y-%m-%d"), "project": document["project"]}
+
+
+async def record(stats, documents: Iterable[dict]):
+    """Add freshly written messages to their rollup buckets with $inc upserts."""
+    counts = Counter((b["day"], b["project"]) for b in map(bucket_id, documents))
+    if not counts:
+        return
+    await stats.bulk_write(
+        [
+            UpdateOne({"_id": {"day": day, "project": project}}, {"$inc": {"count": count}}, upsert=True)
+            for (day, project), count in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+async def rebuild(messages):
+    """Recompute the buckets of every day still in the messages collection.
+
+    Buckets are merged rather than replaced, so days already moved to the
+    cold archive keep their counts.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "project": "$project",
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$merge": {"into": STATS_COLLECTION, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    await messages.aggregate(pipeline).to_list(None)
+
+
+async def summarise(stats, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+    query = {}
+    if since or until:
+        query["_id.day"] = {}
+        if since:
+            query["_id.day"]["$gte"] = since.isoformat()
+        if until:
+            query["_id.day"]["$lte"] = until.isoformat()
+    return summarise_counts(
+        [(bucket["_id"]["day"], bucket["_id"]["project"], bucket["count"]) async for bucket in stats.find(query)]
+    )
+
+
+def summarise_counts(buckets: Iterable[Tuple[str, str, int]]) -> dict:
+    """Totals per project and per day from (day, project, count) buckets."""
+    by_project: Counter = Counter()
+    by_day: Counter = Counter()
+    for day, project, count in buckets:
+        by_project[project] += count
+        by_day[day] += count
+    return {
+        "total": sum(by_day.values()),
+        "by_project": dict(by_project.most_common()),
+        "by_day": dict(sorted(by_day.items())),
+    }
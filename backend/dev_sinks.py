@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Local SMTP and HTTP stand-ins for testing background jobs offline.
+
+    python dev_sinks.py --smtp-port 1025 --http-port 8025 --out sinks.jsonl
+
+then run the API with
+
+    SMTP_HOST=localhost SMTP_PORT=1025 NOTIFY_EMAIL_TO=admin@localhost
+    CRM_WEBHOOK_URL=http://localhost:8025/crm
+
+Every received email and HTTP request is printed and, with --out, appended
+to a JSONL file. --fail-rate makes the HTTP sink answer 503 at random so
+job retries can be exercised.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, kind, **fields):
+        entry = {"kind": kind, "received_at": datetime.utcnow().isoformat(), **fields}
+        print(json.dumps(entry), flush=True)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+async def handle_smtp(reader, writer, recorder):
+    """Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+    async def reply(line):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    await reply("220 localhost dev-sink ESMTP")
+    sender, recipients = None, []
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        command = line.decode(errors="replace").strip()
+        verb = command[:4].upper()
+        if verb in ("EHLO", "HELO"):
+            await reply("250 localhost")
+        elif verb == "MAIL":
+            sender, recipients = command[10:].strip(), []
+            await reply("250 OK")
+        elif verb == "RCPT":
+            recipients.append(command[8:].strip())
+            await reply("250 OK")
+        elif verb == "DATA":
+            await reply("354 End data with <CR><LF>.<CR><LF>")
+            body = []
+            while True:
+                data = await reader.readline()
+                if not data or data in (b".\r\n", b".\n"):
+                    break
+                body.append(data.decode(errors="replace"))
+            recorder.record("smtp", sender=sender, recipients=recipients, data="".join(body))
+            await reply("250 OK: queued")
+        elif verb in ("RSET", "NOOP"):
+            await reply("250 OK")
+        elif verb == "QUIT":
+            await reply("221 Bye")
+            break
+        else:
+            await reply("502 Command not implemented")
+    writer.close()
+
+
+async def handle_http(reader, writer, recorder, fail_rate):
+    request_line = (await reader.readline()).decode(errors="replace").strip()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode(errors="replace").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", "0")))
+    status = "503 Service Unavailable" if random.random() < fail_rate else "200 OK"
+    recorder.record("http", request=request_line, status=status, body=body.decode(errors="replace"))
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--http-port", type=int, default=8025)
+    parser.add_argument("--out", help="Append received items to this JSONL file")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    recorder = Recorder(args.out)
+    smtp = await asyncio.start_server(lambda r, w: handle_smtp(r, w, recorder), args.host, args.smtp_port)
+    http = await asyncio.start_server(lambda r, w: handle_http(r, w, recorder, args.fail_rate), args.host, args.http_port)
+    print(f"SMTP sink on {args.host}:{args.smtp_port}, HTTP sink on {args.host}:{args.http_port}", flush=True)
+    async with smtp, http:
+        await asyncio.gather(smtp.serve_forever(), http.serve_forever())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
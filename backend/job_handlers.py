@@ -0,0 +1,85 @@
+import asyncio
+import os
+import re
+
+import orjson
+
+# Post-submission side effects, run by the job queue rather than inline in
+# submit_contact_form. Each handler receives the stored contact message.
+
+NOTIFY_EMAIL = "notify_email"
+CRM_PUSH = "crm_push"
+SPAM_SCORE = "spam_score"
+
+SPAM_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (r"\bviagra\b", r"\bcasino\b", r"\bcrypto\b", r"\bseo services?\b", r"\bloan\b", r"\bfree money\b")
+]
+URL_RE = re.compile(r"https?://", re.IGNORECASE)
+
+
+def enabled_kinds() -> list:
+    kinds = []
+    if os.environ.get('SMTP_HOST') and os.environ.get('NOTIFY_EMAIL_TO'):
+        kinds.append(NOTIFY_EMAIL)
+    if os.environ.get('CRM_WEBHOOK_URL'):
+        kinds.append(CRM_PUSH)
+    if os.environ.get('CONTACT_SPAM_SCORING', '1') == '1':
+        kinds.append(SPAM_SCORE)
+    return kinds
+
+
+def _send_email(message: dict):
+    # Imported here: most workers never send mail or call the webhook
+    import smtplib
+    from email.message import EmailMessage
+
+    email = EmailMessage()
+    email["Subject"] = f"New contact message from {message['name']}"
+    email["From"] = os.environ.get('NOTIFY_EMAIL_FROM', 'noreply@localhost')
+    email["To"] = os.environ['NOTIFY_EMAIL_TO']
+    email["Reply-To"] = message["email"]
+    email.set_content(f"Project: {message['project']}\n\n{message['message']}\n")
+    with smtplib.SMTP(os.environ['SMTP_HOST'], int(os.environ.get('SMTP_PORT', '25')), timeout=10) as smtp:
+        if os.environ.get('SMTP_STARTTLS', '0') == '1':
+            smtp.starttls()
+        if os.environ.get('SMTP_USER'):
+            smtp.login(os.environ['SMTP_USER'], os.environ.get('SMTP_PASSWORD', ''))
+        smtp.send_message(email)
+
+
+def _post_json(url: str, payload: dict):
+    import urllib.request
+
+    request = urllib.request.Request(
+        url,
+        data=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        if response.status >= 300:
+            raise RuntimeError(f"CRM webhook returned HTTP {response.status}")
+
+
+def spam_score(message: dict) -> float:
+    text = f"{message['name']} {message['project']} {message['message']}"
+    score = 0.3 * sum(1 for pattern in SPAM_PATTERNS if pattern.search(text))
+    score += 0.2 * min(3, len(URL_RE.findall(text)))
+    if message["message"].isupper() and len(message["message"]) > 20:
+        score += 0.2
+    return round(min(1.0, score), 2)
+
+
+def build_handlers(contacts) -> dict:
+    async def notify_email(message: dict):
+        # smtplib and urllib block, so they run on the default executor
+        await asyncio.to_thread(_send_email, message)
+
+    async def crm_push(message: dict):
+        await asyncio.to_thread(_post_json, os.environ['CRM_WEBHOOK_URL'], message)
+
+    async def score(message: dict):
+        await contacts.set_fields(message["id"], {"spam_score": spam_score(message)})
+
+    return {NOTIFY_EMAIL: notify_email, CRM_PUSH: crm_push, SPAM_SCORE: score}
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+JOBS_PROCESSED = REGISTRY.register(Counter(
+    "background_jobs_total", "Background jobs finished by kind and outcome.", ("kind", "outcome")))
+
+Handler = Callable[[dict], Awaitable[None]]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """Mongo-backed job queue with bounded worker concurrency and retries.
+
+    Jobs are claimed atomically with find_one_and_update, which moves
+    ``available_at`` forward by the lease. A job whose worker died becomes
+    claimable again once its lease expires, so jobs survive restarts and
+    several processes can consume the same queue. Failed attempts are
+    retried with exponential backoff and jitter until ``max_attempts``; a
+    job whose lease expires on its last attempt (it keeps crashing its
+    worker) is failed instead of being claimed again.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handlers: Dict[str, Handler],
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        lease: float = 60.0,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+    ):
+        self.collection = collection
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    async def ensure_indexes(self, retention: float = 7 * 24 * 3600):
+        await self.collection.create_index([("status", 1), ("available_at", 1)], name="status_available_at")
+        # Finished jobs are kept for inspection, then expire on their own
+        await self.collection.create_index("finished_at", expireAfterSeconds=int(retention), name="finished_ttl")
+
+    async def enqueue_many(self, jobs: Iterable[Tuple[str, dict]], delay: float = 0, ids: Optional[Sequence[str]] = None):
+        """Queue jobs; with ``ids``, a job whose id is already queued is skipped."""
+        now = datetime.utcnow()
+        documents = [
+            {
+                "kind": kind,
+                "payload": payload,
+                "status": PENDING,
+                "attempts": 0,
+                "available_at": now + timedelta(seconds=delay),
+                "created_at": now,
+            }
+            for kind, payload in jobs
+        ]
+        if ids is not None:
+            for document, job_id in zip(documents, ids):
+                document["_id"] = job_id
+        if documents:
+            try:
+                await self.collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            self._wakeup.set()
+
+    async def enqueue(self, kind: str, payload: dict, delay: float = 0):
+        await self.enqueue_many([(kind, payload)], delay)
+
+    def start(self):
+        for _ in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "status": {"$in": [PENDING, RUNNING]},
+                "attempts": {"$lt": self.max_attempts},
+                "available_at": {"$lte": now},
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "available_at": now + timedelta(seconds=self.lease),
+                    "worker": self.worker_id,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def fail_abandoned(self) -> int:
+        """Fail running jobs whose lease expired with no attempts left."""
+        now = datetime.utcnow()
+        failed = 0
+        while True:
+            job = await self.collection.find_one_and_update(
+                {"status": RUNNING, "attempts": {"$gte": self.max_attempts}, "available_at": {"$lte": now}},
+                {
+                    "$set": {"status": FAILED, "finished_at": now, "last_error": "Lease expired on the last attempt"},
+                    "$unset": {"available_at": ""},
+                },
+            )
+            if job is None:
+                return failed
+            failed += 1
+            JOBS_PROCESSED.inc(job["kind"], "failed")
+            logger.error("Job %s (%s) failed permanently: its worker stopped on attempt %d",
+                         job["_id"], job["kind"], job["attempts"])
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base ** attempts)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.claim()
+                if job is None:
+                    await self.fail_abandoned()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not claim a job")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not record the outcome of job %s", job["_id"])
+
+    async def _run(self, job: dict):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job['kind']!r}")
+            await handler(job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without counting the attempt
+            await self.collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": PENDING, "available_at": datetime.utcnow()}, "$inc": {"attempts": -1}},
+            )
+            raise
+        except Exception as e:
+            await self._failed(job, e)
+        else:
+            now = datetime.utcnow()
+            await self.collection.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": DONE, "finished_at": now}, "$unset": {"available_at": ""}},
+            )
+            JOBS_PROCESSED.inc(job["kind"], "done")
+
+    async def _failed(self, job: dict, error: Exception):
+        now = datetime.utcnow()
+        if job["attempts"] >= self.max_attempts:
+            update = {"status": FAILED, "finished_at": now, "last_error": repr(error)}
+            JOBS_PROCESSED.inc(job["kind"], "failed")
+            logger.error("Job %s (%s) failed permanently: %r", job["_id"], job["kind"], error)
+        else:
+            retry_at = now + timedelta(seconds=self.backoff(job["attempts"]))
+            update = {"status": PENDING, "available_at": retry_at, "last_error": repr(error)}
+            JOBS_PROCESSED.inc(job["kind"], "retry")
+            logger.warning("Job %s (%s) attempt %d failed, retrying: %r", job["_id"], job["kind"], job["attempts"], error)
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+
+class JobOutbox:
+    """Relays jobs recorded on stored documents into a JobQueue.
+
+    Writers list the job kinds a document needs in its ``pending_jobs``
+    field, as part of the write that stores it, so a crash right after the
+    write cannot lose them and the request never waits on the queue. The
+    relay enqueues them under ``<document id>:<kind>`` ids and then clears
+    the field; a relay interrupted in between, or two workers relaying the
+    same document, therefore still queue each job once. ``source`` provides
+    ``pending_jobs(limit)`` and ``clear_pending_jobs(ids)``.
+    """
+
+    def __init__(
+        self,
+        source,
+        queue: JobQueue,
+        payload: Callable[[dict], dict],
+        batch_size: int = 500,
+        poll_interval: float = 5.0,
+    ):
+        self.source = source
+        self.queue = queue
+        self.payload = payload
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def relay(self) -> int:
+        relayed = 0
+        while True:
+            documents = await self.source.pending_jobs(self.batch_size)
+            if not documents:
+                return relayed
+            jobs = [(kind, document) for document in documents for kind in document["pending_jobs"]]
+            await self.queue.enqueue_many(
+                ((kind, self.payload(document)) for kind, document in jobs),
+                ids=[f"{document['id']}:{kind}" for kind, document in jobs],
+            )
+            await self.source.clear_pending_jobs([document["id"] for document in documents])
+            relayed += len(documents)
+            if len(documents) < self.batch_size:
+                return relayed
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        # Polling picks up what a crashed or busy worker left behind
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.relay()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not relay pending jobs")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional
+
+
+class FileInvalidationNotifier:
+    """Shares cache invalidations between worker processes through a file.
+
+    Publishing rewrites the file; readers compare its mtime against the last
+    version they saw, which costs a single stat() per lookup.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def publish(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(str(time.time_ns()))
+
+    def version(self) -> int:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return 0
+        return stat.st_mtime_ns
+
+
+class ListingCache:
+    """Small TTL + LRU cache for read-mostly listing queries.
+
+    ``generation`` changes on every invalidation. A caller that reads it
+    before querying and passes it to set() never caches a result that an
+    invalidation during the query has already made stale.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 5.0, notifier: Optional[FileInvalidationNotifier] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.notifier = notifier
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version = notifier.version() if notifier else 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        self._sync()
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        if generation is not None:
+            self._sync()
+            if generation != self.generation:
+                return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self._entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+        if self.notifier is not None:
+            self.notifier.publish()
+            self._version = self.notifier.version()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+    def _sync(self):
+        # Drop local entries when another worker has published an invalidation
+        if self.notifier is None:
+            return
+        version = self.notifier.version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self.generation += 1
+
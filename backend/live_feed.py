@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Set
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    __slots__ = ("queue", "lagged")
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.lagged = False
+
+
+class Broadcaster:
+    """In-process fan-out of new contact messages to live subscribers.
+
+    publish() never blocks: a subscriber whose queue is full is marked as
+    lagged and closed, and is expected to reconnect with its last event id
+    and catch up from the database. Slow readers therefore cost neither
+    publisher latency nor unbounded memory.
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self.subscribers: Set[Subscription] = set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_queue)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, message: dict):
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        subscription.lagged = True
+        self.subscribers.discard(subscription)
+        # Make room for the close marker so the reader wakes up and exits
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+async def watch_inserts(collection, publish: Callable[[dict], None], projection: dict):
+    """Feed publish() from a Mongo change stream; needs a replica set.
+
+    Documents marked ``imported`` by the bulk endpoint are not published.
+    """
+    resume_token: Optional[dict] = None
+    # Bulk-imported history would overflow every subscriber's queue
+    pipeline = [{"$match": {"operationType": "insert", "fullDocument.imported": {"$ne": True}}}]
+    while True:
+        try:
+            async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    document = change["fullDocument"]
+                    publish({field: document[field] for field in projection if projection[field] and field in document})
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.warning("Change stream interrupted, resuming: %s", e)
+            await asyncio.sleep(1)
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class TokenBucket:
+    """Classic token bucket refilled lazily on each take()."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Rejection(NamedTuple):
+    status_code: int
+    detail: str
+    retry_after: int
+
+
+class LoadShedder:
+    """Admission control: per-client and global token buckets plus an in-flight cap.
+
+    A rate of 0 (or max_in_flight of 0) disables that check. Per-client
+    buckets are kept in a bounded LRU so memory does not grow with the
+    number of distinct clients. A bucket holds at least one token, so a
+    rate below 1/s without a burst still admits one request per 1/rate
+    seconds.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: float = 0,
+        client_rate: float = 0,
+        client_burst: float = 0,
+        max_in_flight: int = 0,
+        max_clients: int = 10000,
+    ):
+        self.global_bucket = TokenBucket(rate, _capacity(rate, burst, "burst")) if rate > 0 else None
+        self.client_rate = client_rate
+        self.client_burst = _capacity(client_rate, client_burst, "client_burst")
+        self.max_in_flight = max_in_flight
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def try_acquire(self, client: str) -> Optional[Rejection]:
+        now = time.monotonic()
+        if self.client_rate > 0:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst)
+                if len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            if not bucket.take(now):
+                return Rejection(429, "Too many requests", _seconds(bucket.retry_after()))
+        if self.global_bucket is not None and not self.global_bucket.take(now):
+            return Rejection(503, "Server busy", _seconds(self.global_bucket.retry_after()))
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return Rejection(503, "Server busy", 1)
+        self.in_flight += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+
+
+def _capacity(rate: float, burst: float, name: str) -> float:
+    # A bucket below one token could never admit anything
+    if 0 < burst < 1:
+        raise ValueError(f"{name} must be at least 1, got {burst}")
+    return max(1.0, burst or rate)
+
+
+def _seconds(value: float) -> int:
+    return max(1, int(value + 0.999))
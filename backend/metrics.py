@@ -0,0 +1,221 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_text = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("route", "method")))
+HTTP_DB_TIME = REGISTRY.register(Histogram(
+    "http_request_db_seconds", "Time spent in MongoDB commands per HTTP request.", ("route", "method")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+MONGO_COMMANDS = REGISTRY.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by command name.", ("command",)))
+MONGO_FAILURES = REGISTRY.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands by command name.", ("command",)))
+
+
+class RequestTiming:
+    """Per-request accumulator shared with Mongo listeners through a context var.
+
+    ``handler_started``/``handler_finished`` are stamped around the endpoint
+    call, which splits the request into validation, handler and response
+    serialisation phases for the Server-Timing header.
+    """
+
+    __slots__ = ("started", "handler_started", "handler_finished", "db_seconds", "serialize_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler_started: Optional[float] = None
+        self.handler_finished: Optional[float] = None
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+# Motor copies the context into its executor threads, so listeners see this
+current_timing: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar("current_timing", default=None)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding the Mongo histograms."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        MONGO_FAILURES.inc(event.command_name)
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.observe(seconds, event.command_name)
+        timing = current_timing.get()
+        if timing is not None:
+            timing.db_seconds += seconds
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status codes and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            current_timing.reset(token)
+            # Label by route template rather than raw path to bound cardinality
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(path, method, str(status))
+            HTTP_LATENCY.observe(elapsed, path, method)
+            HTTP_DB_TIME.observe(timing.db_seconds, path, method)
+
+
+@contextlib.contextmanager
+def serializing():
+    """Counts serialisation done inside an endpoint towards the request's serialize phase."""
+    timing = current_timing.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing.serialize_seconds += time.perf_counter() - started
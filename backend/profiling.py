@@ -0,0 +1,177 @@
+import asyncio
+import cProfile
+import functools
+import hmac
+import importlib.util
+import logging
+import random
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from metrics import RequestTiming, current_timing
+
+# pyinstrument is only imported once a speedscope profile is taken
+HAVE_PYINSTRUMENT = importlib.util.find_spec("pyinstrument") is not None
+
+logger = logging.getLogger(__name__)
+
+
+def _timed_endpoint(endpoint):
+    # Stamps the endpoint call so the time before it counts as validation
+    # and the time after it (until the response starts) as serialisation
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.handler_started = time.perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if timing is not None:
+                timing.handler_finished = time.perf_counter()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records handler start/end on the request's RequestTiming."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def server_timing_header(timing: RequestTiming, now: float) -> str:
+    phases = []
+    if timing.handler_started is not None and timing.handler_finished is not None:
+        handler = timing.handler_finished - timing.handler_started
+        phases += [
+            ("validate", timing.handler_started - timing.started),
+            ("db", timing.db_seconds),
+            ("app", max(0.0, handler - timing.db_seconds - timing.serialize_seconds)),
+            ("serialize", timing.serialize_seconds + now - timing.handler_finished),
+        ]
+    phases.append(("total", now - timing.started))
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases)
+
+
+def _slug(route: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+
+class ProfilingMiddleware:
+    """Opt-in per-request profiling and Server-Timing breakdown.
+
+    A request is profiled when it carries ``X-Profile: <token>`` matching
+    the configured token, or when it is picked by ``sample_rate``. The
+    profile is written to ``directory`` as pstats (cProfile) or, with the
+    pyinstrument package and ``fmt="speedscope"``, as speedscope JSON,
+    named after the time, route, status and duration. Profiled requests
+    (and every request with ``server_timing``) get a Server-Timing header
+    splitting validation, DB, handler and serialisation time.
+
+    cProfile hooks the whole event-loop thread, so only one request per
+    worker is profiled at a time and other requests interleaving with it
+    show up in its profile; pyinstrument's async mode attributes awaits to
+    the profiled task only.
+    """
+
+    def __init__(
+        self,
+        app,
+        directory,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        fmt: str = "pstats",
+        server_timing: bool = False,
+    ):
+        self.app = app
+        self.directory = Path(directory)
+        self.token = token
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        if fmt == "speedscope" and not HAVE_PYINSTRUMENT:
+            logger.warning("pyinstrument is not installed, writing pstats profiles instead")
+            fmt = "pstats"
+        self.fmt = fmt
+        self._busy = False
+
+    def wants_profile(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = not self._busy and self.wants_profile(scope)
+        if not profile and not self.server_timing:
+            await self.app(scope, receive, send)
+            return
+
+        timing = current_timing.get()
+        token = None
+        if timing is None:
+            timing = RequestTiming()
+            token = current_timing.set(timing)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timing, time.perf_counter()))
+            await send(message)
+
+        profiler = stop = None
+        if profile:
+            self._busy = True
+            profiler, stop = self._start_profiler()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - timing.started
+            if profiler is not None:
+                stop()
+                self._busy = False
+            if token is not None:
+                current_timing.reset(token)
+        if profiler is not None:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            await asyncio.to_thread(self._write, profiler, scope["method"], route, status, elapsed)
+
+    def _start_profiler(self):
+        if self.fmt == "speedscope":
+            from pyinstrument import Profiler as SamplingProfiler
+
+            profiler = SamplingProfiler(async_mode="enabled")
+            profiler.start()
+            return profiler, profiler.stop
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler, profiler.disable
+
+    def _write(self, profiler, method: str, route: str, status: int, elapsed: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S.%f")
+        name = f"{stamp}_{method}_{_slug(route)}_{status}_{elapsed * 1000:.0f}ms"
+        if self.fmt == "speedscope":
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            path = self.directory / f"{name}.speedscope.json"
+            path.write_text(profiler.output(renderer=SpeedscopeRenderer()))
+        else:
+            path = self.directory / f"{name}.pstats"
+            profiler.dump_stats(str(path))
+        logger.info("Wrote profile of %s %s (%.1f ms) to %s", method, route, elapsed * 1000, path)
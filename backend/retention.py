@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import socket
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from cold_archive import ColdArchive
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_ARCHIVED = REGISTRY.register(Counter(
+    "contact_messages_archived_total", "Contact messages moved to the cold archive."))
+
+LOCK_ID = "contact_retention"
+
+
+class RetentionSweeper:
+    """Moves messages older than the retention window into the cold archive.
+
+    The cutoff is midnight UTC ``days`` days ago, so whole days leave the
+    hot collection together. Each batch is written to its day partitions
+    before it is deleted; a sweep interrupted in between only re-archives
+    the same messages next time. Every worker runs a sweeper, but a lease
+    document in ``locks`` lets only one of them sweep at a time; without a
+    locks collection (in-memory store) the sweeper assumes it is alone.
+    """
+
+    def __init__(
+        self,
+        contacts,
+        locks,
+        archive: ColdArchive,
+        days: int,
+        interval: float = 3600.0,
+        batch_size: int = 5000,
+        lease: float = 600.0,
+        on_archived: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    ):
+        self.contacts = contacts
+        self.locks = locks
+        self.archive = archive
+        self.days = days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.on_archived = on_archived
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.utcnow()
+        return datetime.combine(now.date() - timedelta(days=self.days), time.min)
+
+    async def acquire(self) -> bool:
+        """Take or renew the sweep lease; False while another worker holds it."""
+        if self.locks is None:
+            return True
+        now = datetime.utcnow()
+        try:
+            await self.locks.update_one(
+                {"_id": LOCK_ID, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def release(self):
+        if self.locks is not None:
+            await self.locks.delete_one({"_id": LOCK_ID, "owner": self.owner})
+
+    async def sweep(self) -> int:
+        if not await self.acquire():
+            return 0
+        cutoff = self.cutoff()
+        archived = 0
+        try:
+            while True:
+                batch = await self.contacts.expired(cutoff, self.batch_size)
+                if not batch:
+                    break
+                by_day = defaultdict(list)
+                for message in batch:
+                    by_day[message["created_at"].date()].append(message)
+                for day, messages in by_day.items():
+                    await asyncio.to_thread(self.archive.write, day, messages)
+                await self.contacts.delete(batch)
+                archived += len(batch)
+                MESSAGES_ARCHIVED.inc(amount=len(batch))
+                if self.on_archived is not None:
+                    await self.on_archived(batch)
+                if len(batch) < self.batch_size or not await self.acquire():
+                    break
+        finally:
+            await self.release()
+        if archived:
+            logger.info("Archived %d contact messages older than %s", archived, cutoff.date())
+        return archived
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Retention sweep failed")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Multi-worker entry point for the API.
+
+    python serve.py                       # one worker per CPU core
+    WEB_CONCURRENCY=4 PORT=8001 python serve.py
+
+Each uvicorn worker is a separate process that imports server.py and runs
+its lifespan handler, so every worker owns its own Motor client and pool.
+Size MONGO_MAX_POOL_SIZE per worker: the server sees workers x pool size
+connections in total.
+
+The listing cache is per worker too. Unless CONTACT_CACHE_NOTIFY_FILE is
+set, serve.py points it at a file in the temp directory, so a write on
+one worker invalidates the cache on all of them. Under gunicorn, set
+CONTACT_CACHE_NOTIFY_FILE yourself or CONTACT_CACHE_TTL=0; otherwise other
+workers can serve a listing (or a 304) up to the TTL old after a write.
+
+Under gunicorn the equivalent is:
+
+    gunicorn server:app -k uvicorn.workers.UvicornWorker -w $(nproc) -b 0.0.0.0:8001
+
+uvicorn starts workers with spawn, so each one pays the full import cost
+(mostly FastAPI itself; see benchmarks/startup_bench.py). Adding --preload
+to gunicorn imports once in the master and forks ready workers. That is
+safe because the Mongo client is only created in the per-worker lifespan.
+"""
+
+import os
+import tempfile
+
+import uvicorn
+
+
+def main():
+    workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+    if workers > 1:
+        # Inherited by every worker, so they share cache invalidations
+        os.environ.setdefault(
+            'CONTACT_CACHE_NOTIFY_FILE',
+            os.path.join(tempfile.gettempdir(), f"contact-cache-{os.getpid()}"),
+        )
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=workers,
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=int(os.environ.get('KEEP_ALIVE', '5')),
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+if __name__ == "__main__":
+    main()
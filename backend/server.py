@@ -1,28 +1,181 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
 import uuid
-from datetime import datetime
+import json
+import base64
+import csv
+import io
+import orjson
+import hashlib
+import hmac
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import date, datetime, timezone
+from write_behind import WriteBehindQueue
+from listing_cache import ListingCache, FileInvalidationNotifier
+from metrics import REGISTRY, MetricsMiddleware, MongoCommandMetrics, serializing
+from load_shedding import LoadShedder
+from live_feed import Broadcaster, watch_inserts
+from compression import CompressionMiddleware
+from bulk_import import iter_json_array, iter_ndjson
+from jobs import JobOutbox, JobQueue
+import job_handlers
+from profiling import ProfilingMiddleware, TimedRoute
+from contact_repository import (
+    CONTACT_FIELDS,
+    CONTACT_PROJECTION,
+    ContactRepository,
+    MemoryContactRepository,
+    MotorContactRepository,
+    public_fields,
+)
+from cold_archive import ColdArchive
+from retention import RetentionSweeper
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, created per worker process in the lifespan handler
+client: Optional[AsyncIOMotorClient] = None
+db = None
+db_ready = False
+
+# Contact message storage: 'mongo', or 'memory' to run (and benchmark) without
+# a Mongo server; the in-memory store has no background jobs and no persistence
+CONTACT_STORE = os.environ.get('CONTACT_STORE', 'mongo')
+contacts: Optional[ContactRepository] = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+        maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_MS', '300000')),
+        connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000')),
+        event_listeners=[MongoCommandMetrics()],
+    )
+
+# Optional write-behind batching for contact submissions
+WRITE_BEHIND_ENABLED = os.environ.get('CONTACT_WRITE_BEHIND', '0') == '1'
+contact_writer: Optional[WriteBehindQueue] = None
+
+# Read cache for the contact listing, invalidated on every write. Other
+# workers only see the invalidation through CONTACT_CACHE_NOTIFY_FILE (serve.py
+# sets one); without it they can serve listings up to CONTACT_CACHE_TTL stale
+CACHE_TTL = float(os.environ.get('CONTACT_CACHE_TTL', '5'))
+CACHE_NOTIFY_FILE = os.environ.get('CONTACT_CACHE_NOTIFY_FILE')
+contact_cache: Optional[ListingCache] = None
+if CACHE_TTL > 0:
+    contact_cache = ListingCache(
+        maxsize=int(os.environ.get('CONTACT_CACHE_SIZE', '128')),
+        ttl=CACHE_TTL,
+        notifier=FileInvalidationNotifier(CACHE_NOTIFY_FILE) if CACHE_NOTIFY_FILE else None,
+    )
+
+def invalidate_contact_cache():
+    if contact_cache is not None:
+        contact_cache.invalidate()
+
+# Live feed of new messages; with change streams every worker sees every insert
+CHANGE_STREAM_FEED = os.environ.get('CONTACT_FEED_CHANGE_STREAM', '0') == '1'
+FEED_HEARTBEAT = float(os.environ.get('CONTACT_FEED_HEARTBEAT', '15'))
+contact_feed = Broadcaster(max_queue=int(os.environ.get('CONTACT_FEED_QUEUE', '256')))
+feed_watcher: Optional[asyncio.Task] = None
+
+# Post-submission side effects (email, CRM, spam scoring) run as background jobs.
+# The jobs a message needs are stored on it (pending_jobs) in the same write,
+# and the outbox relays them into the queue off the request path
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+job_queue: Optional[JobQueue] = None
+job_outbox: Optional[JobOutbox] = None
+job_kinds: List[str] = []
+
+def attach_jobs(document: dict):
+    if job_kinds:
+        document["pending_jobs"] = list(job_kinds)
+
+async def contact_written(documents: List[dict]):
+    # Runs after every successful write, direct or batched. The messages are
+    # already stored, so a failing side effect is logged rather than turned
+    # into an error the client would retry (and duplicate) on
+    invalidate_contact_cache()
+    if feed_watcher is None:
+        for document in documents:
+            if not document.get("imported"):
+                contact_feed.publish(public_fields(document))
+    try:
+        await contacts.record_stats(documents)
+    except Exception:
+        logger.exception("Could not update contact rollups for %d messages", len(documents))
+    if job_outbox is not None and any("pending_jobs" in document for document in documents):
+        job_outbox.notify()
+
+# Retention: messages older than CONTACT_RETENTION_DAYS move to compressed
+# day files in CONTACT_ARCHIVE_DIR; 0 keeps everything in the hot collection
+RETENTION_DAYS = int(os.environ.get('CONTACT_RETENTION_DAYS', '0'))
+contact_archive = ColdArchive(os.environ.get('CONTACT_ARCHIVE_DIR', str(ROOT_DIR / 'archive')))
+retention_sweeper: Optional[RetentionSweeper] = None
+
+async def contact_archived(documents: List[dict]):
+    # Rollups are lifetime counts, so the stats are left as they are
+    invalidate_contact_cache()
+
+# Recently answered Idempotency-Key values, in front of the unique index
+idempotency_cache = ListingCache(
+    maxsize=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('IDEMPOTENCY_CACHE_TTL', '300')),
+)
+
+# Admission control for POST /api/contact; every limit is off when 0
+contact_shedder = LoadShedder(
+    rate=float(os.environ.get('CONTACT_RATE_LIMIT', '0')),
+    burst=float(os.environ.get('CONTACT_RATE_BURST', '0')),
+    client_rate=float(os.environ.get('CONTACT_CLIENT_RATE_LIMIT', '0')),
+    client_burst=float(os.environ.get('CONTACT_CLIENT_RATE_BURST', '0')),
+    max_in_flight=int(os.environ.get('CONTACT_MAX_IN_FLIGHT', '0')),
+)
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', '0') == '1'
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    await startup_db_client()
+    try:
+        yield
+    finally:
+        await shutdown_db_client()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
+
+def utc_now_ms() -> datetime:
+    # Mongo stores milliseconds; truncating up front keeps responses, feed
+    # events and cursors identical to what is read back later
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def naive_utc(value: datetime) -> datetime:
+    # Stored timestamps are naive UTC; client-supplied ones may carry an offset,
+    # which pymongo would convert but the in-memory store cannot compare
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 # Contact form model
 class ContactMessage(BaseModel):
@@ -31,7 +184,7 @@ class ContactMessage(BaseModel):
     email: str
     project: str
     message: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now_ms)
 
 class ContactMessageCreate(BaseModel):
     name: str
@@ -39,17 +192,423 @@ class ContactMessageCreate(BaseModel):
     project: str
     message: str
 
+class ContactMessagePage(BaseModel):
+    items: List[ContactMessage]
+    next_cursor: Optional[str] = None
+
+class ContactSearchHit(ContactMessage):
+    score: float
+
+class ContactSearchPage(BaseModel):
+    items: List[ContactSearchHit]
+    next_cursor: Optional[str] = None
+
+class ContactStats(BaseModel):
+    total: int
+    by_project: Dict[str, int]
+    by_day: Dict[str, int]
+
+class BulkRecordError(BaseModel):
+    index: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkRecordError] = []
+    errors_truncated: bool = False
+
+class RawJSONResponse(Response):
+    """Response whose body was already serialised with orjson."""
+    media_type = "application/json"
+
+# Keyset pagination over (created_at, id), newest first; see contact_repository
+def encode_cursor(message: dict, score: Optional[float] = None) -> str:
+    payload = {"created_at": message["created_at"].isoformat(), "id": message["id"]}
+    if score is not None:
+        payload["score"] = score
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def read_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = {
+            "created_at": naive_utc(datetime.fromisoformat(payload["created_at"])),
+            "id": str(payload["id"]),
+        }
+        if "score" in payload:
+            position["score"] = float(payload["score"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+EXPORT_BATCH_SIZE = 500
+
+def client_address(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
 # Contact form endpoint
 @api_router.post("/contact", response_model=ContactMessage)
-async def submit_contact_form(contact: ContactMessageCreate):
-    contact_obj = ContactMessage(**contact.dict())
-    await db.contact_messages.insert_one(contact_obj.dict())
-    return contact_obj
+async def submit_contact_form(
+    contact: ContactMessageCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    if idempotency_key:
+        body = idempotency_cache.get(idempotency_key)
+        if body is not None:
+            return RawJSONResponse(body)
+    rejection = contact_shedder.try_acquire(client_address(request))
+    if rejection is not None:
+        raise HTTPException(
+            status_code=rejection.status_code,
+            detail=rejection.detail,
+            headers={"Retry-After": str(rejection.retry_after)},
+        )
+    try:
+        if idempotency_key:
+            body = await store_idempotent_contact(contact, idempotency_key)
+        else:
+            body = await store_contact(contact)
+    finally:
+        contact_shedder.release()
+    return RawJSONResponse(body)
+
+async def store_contact(contact: ContactMessageCreate) -> bytes:
+    document = ContactMessage(**contact.dict()).dict()
+    # Serialise before the write, since the driver adds _id to the document
+    body = orjson.dumps(document)
+    attach_jobs(document)
+    if contact_writer is not None:
+        await contact_writer.submit(document)
+    else:
+        await contacts.insert(document)
+        await contact_written([document])
+    return body
+
+async def store_idempotent_contact(contact: ContactMessageCreate, idempotency_key: str) -> bytes:
+    # Always written directly: the unique index has to reject a replay before we answer
+    document = ContactMessage(**contact.dict()).dict()
+    body = orjson.dumps(document)
+    document["idempotency_key"] = idempotency_key
+    attach_jobs(document)
+    try:
+        await contacts.insert(document)
+    except DuplicateKeyError:
+        original = await contacts.find_by_idempotency_key(idempotency_key)
+        body = orjson.dumps(original)
+    else:
+        await contact_written([document])
+    idempotency_cache.set(idempotency_key, body)
+    return body
 
-@api_router.get("/contact", response_model=List[ContactMessage])
-async def get_contact_messages():
-    messages = await db.contact_messages.find().sort([("created_at", -1)]).to_list(100)
-    return [ContactMessage(**message) for message in messages]
+async def contact_validators(request: Request) -> Tuple[str, Optional[datetime]]:
+    # The newest created_at plus the message count change whenever the data does
+    last_modified, count = await contacts.latest()
+    key = f"{count}|{last_modified}|{request.url.path}?{request.url.query}"
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"', last_modified
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        opaque = etag.removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or opaque in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+    return False
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+# Bulk import is an admin operation: Authorization: Bearer <BULK_IMPORT_TOKEN>,
+# and disabled while no token is configured
+BULK_IMPORT_TOKEN = os.environ.get('BULK_IMPORT_TOKEN') or None
+BULK_CHUNK_SIZE = int(os.environ.get('CONTACT_BULK_CHUNK_SIZE', '1000'))
+BULK_MAX_ERRORS = 1000
+
+def record_bulk_error(result: BulkImportResult, index: int, error: str):
+    result.failed += 1
+    if len(result.errors) < BULK_MAX_ERRORS:
+        result.errors.append(BulkRecordError(index=index, error=error))
+    else:
+        result.errors_truncated = True
+
+async def insert_bulk_chunk(documents: List[dict], indexes: List[int], result: BulkImportResult):
+    failed = set()
+    try:
+        await contacts.insert_many(documents)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed.add(error["index"])
+            record_bulk_error(result, indexes[error["index"]], error.get("errmsg", "Write failed"))
+    written = [document for i, document in enumerate(documents) if i not in failed]
+    result.inserted += len(written)
+    if written:
+        # Imported history carries no pending_jobs, so no notifications or CRM
+        # pushes, and is marked imported, so it stays off the live feed
+        await contact_written(written)
+
+@api_router.post("/contact/bulk", response_model=BulkImportResult)
+async def bulk_import_contact_messages(request: Request, authorization: Optional[str] = Header(None)):
+    if not BULK_IMPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Bulk import is disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), BULK_IMPORT_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    rejection = contact_shedder.try_acquire(client_address(request))
+    if rejection is not None:
+        raise HTTPException(
+            status_code=rejection.status_code,
+            detail=rejection.detail,
+            headers={"Retry-After": str(rejection.retry_after)},
+        )
+    try:
+        return await import_contact_messages(request)
+    finally:
+        contact_shedder.release()
+
+async def import_contact_messages(request: Request) -> BulkImportResult:
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = iter_ndjson(request.stream())
+    else:
+        records = iter_json_array(request.stream())
+    result = BulkImportResult()
+    documents, indexes = [], []
+    pending: Optional[asyncio.Task] = None
+    try:
+        async for index, record in records:
+            result.received += 1
+            if isinstance(record, ValueError):
+                record_bulk_error(result, index, str(record))
+                continue
+            try:
+                contact = ContactMessageCreate(**record)
+            except TypeError:
+                record_bulk_error(result, index, "Record must be a JSON object")
+                continue
+            except ValidationError as e:
+                details = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                record_bulk_error(result, index, details)
+                continue
+            documents.append(ContactMessage(**contact.dict()).dict() | {"imported": True})
+            indexes.append(index)
+            if len(documents) >= BULK_CHUNK_SIZE:
+                # Keep one insert_many in flight while the next chunk is parsed
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(insert_bulk_chunk(documents, indexes, result))
+                documents, indexes = [], []
+    except ValueError as e:
+        # The body itself is malformed; keep what was already imported
+        record_bulk_error(result, result.received, str(e))
+    finally:
+        if pending is not None:
+            await pending
+    if documents:
+        await insert_bulk_chunk(documents, indexes, result)
+    return result
+
+def render_contact_page(messages: List[dict], limit: int) -> bytes:
+    # Documents come straight from the repository with CONTACT_FIELDS only, so they are
+    # serialised as-is instead of being validated into ContactMessage twice
+    next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    with serializing():
+        return orjson.dumps({"items": messages[:limit], "next_cursor": next_cursor})
+
+@api_router.get("/contact", response_model=ContactMessagePage)
+async def get_contact_messages(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+):
+    cache_key = (limit, after)
+    entry = contact_cache.get(cache_key) if contact_cache is not None else None
+    if entry is None:
+        # Taken before querying, so a write that lands meanwhile keeps this result out of the cache
+        generation = contact_cache.generation if contact_cache is not None else None
+        etag, last_modified = await contact_validators(request)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        position = read_cursor(after) if after else None
+        # Fetch one extra row to know whether another page exists
+        messages = await contacts.page(limit + 1, position)
+        entry = (render_contact_page(messages, limit), etag, last_modified)
+        if contact_cache is not None:
+            contact_cache.set(cache_key, entry, generation)
+    body, etag, last_modified = entry
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return RawJSONResponse(body, headers=validator_headers(etag, last_modified))
+
+@api_router.get("/contact/search", response_model=ContactSearchPage)
+async def search_contact_messages(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+):
+    position = read_cursor(after) if after else None
+    if position is not None and "score" not in position:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    etag, last_modified = await contact_validators(request)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    hits = await contacts.search(q, limit + 1, position)
+    next_cursor = encode_cursor(hits[limit - 1], hits[limit - 1]["score"]) if len(hits) > limit else None
+    with serializing():
+        body = orjson.dumps({"items": hits[:limit], "next_cursor": next_cursor})
+    return RawJSONResponse(body, headers=validator_headers(etag, last_modified))
+
+@api_router.get("/contact/stats", response_model=ContactStats)
+async def get_contact_stats(
+    request: Request,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+):
+    # Rollups change apart from the messages (after the insert, on backfill,
+    # or not at all when the update fails), so the ETag is taken from the
+    # totals themselves; the rollup read is cheap, the response is what's saved
+    stats = await contacts.stats(since, until)
+    with serializing():
+        body = orjson.dumps(stats)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+    if is_not_modified(request, etag, None):
+        return not_modified_response(etag, None)
+    return RawJSONResponse(body, headers=validator_headers(etag, None))
+
+@api_router.get("/contact/cache/stats")
+async def get_contact_cache_stats():
+    if contact_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **contact_cache.stats()}
+
+async def export_rows(messages, fmt: str):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CONTACT_FIELDS, extrasaction="ignore")
+    if fmt == "csv":
+        writer.writeheader()
+    rows = 0
+    async for message in messages:
+        message["created_at"] = message["created_at"].isoformat()
+        if fmt == "csv":
+            writer.writerow(message)
+        else:
+            buffer.write(json.dumps(message))
+            buffer.write("\n")
+        rows += 1
+        # Flush one chunk per batch so memory stays bounded
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@api_router.get("/contact/export")
+async def export_contact_messages(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(contacts.scan(since=naive_utc(since) if since else None), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="contact_messages.{format}"'},
+    )
+
+@api_router.get("/contact/archive")
+async def export_archived_messages(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    project: Optional[str] = None,
+    email: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    # Reads the day partitions in [since, until] on demand; nothing is loaded into Mongo
+    def match(message: dict) -> bool:
+        return (project is None or message["project"] == project) and (email is None or message["email"] == email)
+
+    messages = map(public_fields, contact_archive.scan(since, until, match))
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_rows(iterate_in_threadpool(messages), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="contact_archive.{format}"'},
+    )
+
+def feed_event(message: dict) -> str:
+    # The event id doubles as the resume token: it is a listing cursor
+    return f"id: {encode_cursor(message)}\nevent: contact\ndata: {orjson.dumps(message).decode()}\n\n"
+
+async def feed_events(position: Optional[dict]):
+    # Subscribe before replaying so nothing published meanwhile is lost
+    subscription = contact_feed.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        replayed = set()
+        if position is not None:
+            async for message in contacts.scan(after=position):
+                replayed.add(message["id"])
+                yield feed_event(message)
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:
+                # Dropped for lagging; the client reconnects with Last-Event-ID
+                break
+            if message["id"] not in replayed:
+                yield feed_event(message)
+    finally:
+        contact_feed.unsubscribe(subscription)
+
+@api_router.get("/contact/stream")
+async def stream_contact_messages(
+    after: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    token = last_event_id or after
+    position = read_cursor(token) if token else None
+    return StreamingResponse(
+        feed_events(position),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/ready")
+async def readiness_probe():
+    if not db_ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    try:
+        await asyncio.wait_for(contacts.ping(), timeout=2)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
 
 # Basic routes
 @api_router.get("/")
@@ -67,13 +626,114 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
 )
+
+# Opt-in profiling: X-Profile: <PROFILE_TOKEN> or a PROFILE_SAMPLE_RATE fraction of requests
+app.add_middleware(
+    ProfilingMiddleware,
+    directory=os.environ.get('PROFILE_DIR', str(ROOT_DIR / 'profiles')),
+    token=os.environ.get('PROFILE_TOKEN') or None,
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    fmt=os.environ.get('PROFILE_FORMAT', 'pstats'),
+    server_timing=os.environ.get('SERVER_TIMING', '0') == '1',
+)
+
+app.add_middleware(MetricsMiddleware)
+
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+def configure_logging():
+    # Done from the lifespan rather than at import, so importing the module
+    # (tests, scripts, benchmarks) has no global side effects
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+async def warm_pool():
+    # Open minPoolSize connections up front so the first requests don't pay for them
+    connections = max(1, int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')))
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+
+async def startup_db_client():
+    global client, db, contacts, contact_writer, feed_watcher, job_queue, job_outbox, job_kinds, retention_sweeper
+    global db_ready
+    if CONTACT_STORE == 'memory':
+        contacts = MemoryContactRepository(batch_size=EXPORT_BATCH_SIZE)
+    else:
+        client = create_mongo_client()
+        db = client[os.environ['DB_NAME']]
+        await warm_pool()
+        contacts = MotorContactRepository(db, batch_size=EXPORT_BATCH_SIZE)
+    await contacts.ensure_indexes()
+    if db is not None:
+        job_kinds = job_handlers.enabled_kinds()
+        job_queue = JobQueue(
+            db.jobs,
+            job_handlers.build_handlers(contacts),
+            concurrency=JOB_WORKERS,
+            max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5')),
+            lease=float(os.environ.get('JOB_LEASE_SECONDS', '60')),
+        )
+        await job_queue.ensure_indexes()
+        job_queue.start()
+        job_outbox = JobOutbox(
+            contacts,
+            job_queue,
+            public_fields,
+            poll_interval=float(os.environ.get('JOB_OUTBOX_POLL_SECONDS', '5')),
+        )
+        job_outbox.start()
+    if WRITE_BEHIND_ENABLED:
+        contact_writer = WriteBehindQueue(
+            contacts,
+            batch_size=int(os.environ.get('CONTACT_WRITE_BATCH_SIZE', '100')),
+            flush_interval=float(os.environ.get('CONTACT_WRITE_FLUSH_MS', '50')) / 1000,
+            max_buffer=int(os.environ.get('CONTACT_WRITE_MAX_BUFFER', '10000')),
+            durability=os.environ.get('CONTACT_WRITE_DURABILITY', 'flush'),
+            on_flush=contact_written,
+        )
+        contact_writer.start()
+    if CHANGE_STREAM_FEED and db is not None:
+        feed_watcher = asyncio.create_task(
+            watch_inserts(db.contact_messages, contact_feed.publish, CONTACT_PROJECTION)
+        )
+    if RETENTION_DAYS > 0:
+        retention_sweeper = RetentionSweeper(
+            contacts,
+            db.locks if db is not None else None,
+            contact_archive,
+            RETENTION_DAYS,
+            interval=float(os.environ.get('CONTACT_RETENTION_INTERVAL', '3600')),
+            batch_size=int(os.environ.get('CONTACT_RETENTION_BATCH_SIZE', '5000')),
+            on_archived=contact_archived,
+        )
+        retention_sweeper.start()
+    db_ready = True
+    logger.info("Contact store %r ready (pid %d)", CONTACT_STORE, os.getpid())
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    global contact_writer, feed_watcher, job_queue, job_outbox, retention_sweeper, db_ready
+    db_ready = False
+    if feed_watcher is not None:
+        feed_watcher.cancel()
+        feed_watcher = None
+    if retention_sweeper is not None:
+        await retention_sweeper.stop()
+        retention_sweeper = None
+    if contact_writer is not None:
+        await contact_writer.drain()
+        contact_writer = None
+    if job_outbox is not None:
+        # Anything not relayed yet stays on its message for the next relay
+        await job_outbox.stop()
+        job_outbox = None
+    if job_queue is not None:
+        # Jobs still running are handed back and picked up after restart
+        await job_queue.stop()
+        job_queue = None
+    if client is not None:
+        client.close()
@@ -0,0 +1,86 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# (score, created_at, id); results are ordered by this tuple, descending
+SearchKey = Tuple[float, datetime, str]
+
+# created_at is stamped before the insert is awaited, so a message can land
+# after a newer one was already synced; each sync re-reads this far back
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+class InvertedIndex:
+    """In-process inverted index used when the server has no $text support.
+
+    Only postings and sort keys are held in memory; matching documents are
+    fetched from the collection by id. The index follows the collection by
+    pulling documents from ``overlap`` before its watermark onwards before
+    each search, so writes from other workers and from the write-behind
+    queue are picked up without any write-path hook, as long as they are
+    stored within ``overlap`` of their created_at. Documents already
+    indexed are skipped.
+    """
+
+    def __init__(self, fields: Sequence[str], weights: Optional[Dict[str, int]] = None):
+        self.fields = tuple(fields)
+        self.weights = weights or {}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.created: Dict[str, datetime] = {}
+        self.watermark: Optional[datetime] = None
+
+    def add(self, document: dict):
+        doc_id = document["id"]
+        if doc_id in self.created:
+            return
+        self.created[doc_id] = document["created_at"]
+        for field in self.fields:
+            weight = self.weights.get(field, 1)
+            for token in tokenize(str(document.get(field, ""))):
+                postings = self.postings[token]
+                postings[doc_id] = postings.get(doc_id, 0) + weight
+        if self.watermark is None or document["created_at"] > self.watermark:
+            self.watermark = document["created_at"]
+
+    def remove(self, document: dict):
+        """Drop a document that left the collection, e.g. into the archive."""
+        doc_id = document["id"]
+        if self.created.pop(doc_id, None) is None:
+            return
+        for field in self.fields:
+            for token in tokenize(str(document.get(field, ""))):
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[token]
+
+    async def sync(self, collection, batch_size: int = 1000, overlap: timedelta = SYNC_OVERLAP):
+        query = {"created_at": {"$gte": self.watermark - overlap}} if self.watermark else {}
+        projection = {field: 1 for field in self.fields} | {"id": 1, "created_at": 1, "_id": 0}
+        async for document in collection.find(query, projection).sort("created_at", 1).batch_size(batch_size):
+            self.add(document)
+
+    def search(self, query: str, limit: int, after: Optional[SearchKey] = None) -> List[SearchKey]:
+        scores: Dict[str, float] = defaultdict(float)
+        total = len(self.created) or 1
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for doc_id, tf in postings.items():
+                scores[doc_id] += tf * idf
+        keys = ((round(score, 6), self.created[doc_id], doc_id) for doc_id, score in scores.items())
+        if after is not None:
+            keys = (key for key in keys if key < after)
+        return heapq.nlargest(limit, keys)
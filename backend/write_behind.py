@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Durability modes: acknowledge once the batch is written, or as soon as it is queued
+DURABILITY_FLUSH = "flush"
+DURABILITY_ENQUEUE = "enqueue"
+
+
+class WriteBehindQueue:
+    """Buffers documents in-process and writes them with unordered insert_many.
+
+    A batch is flushed when it reaches ``batch_size`` documents or when
+    ``flush_interval`` seconds have passed since its first document arrived.
+    The buffer is bounded by ``max_buffer``; producers wait when it is full.
+    """
+
+    def __init__(
+        self,
+        repository,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        max_buffer: int = 10000,
+        durability: str = DURABILITY_FLUSH,
+        on_flush: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    ):
+        if durability not in (DURABILITY_FLUSH, DURABILITY_ENQUEUE):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.on_flush = on_flush
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, document: dict):
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        future = None
+        if self.durability == DURABILITY_FLUSH:
+            future = asyncio.get_running_loop().create_future()
+        await self._queue.put((document, future))
+        if future is not None:
+            await future
+
+    async def drain(self):
+        """Stop accepting documents and flush everything still buffered."""
+        self._closed = True
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]):
+        errors = {}
+        try:
+            await self.repository.insert_many([document for document, _ in batch])
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        except Exception as e:
+            errors = {index: e for index in range(len(batch))}
+
+        written = [document for index, (document, _) in enumerate(batch) if index not in errors]
+        if self.on_flush is not None and written:
+            try:
+                await self.on_flush(written)
+            except Exception:
+                logger.exception("Write-behind on_flush hook failed")
+        if errors:
+            logger.error("Write-behind flush failed for %d of %d documents", len(errors), len(batch))
+        for index, (_, future) in enumerate(batch):
+            if future is None or future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
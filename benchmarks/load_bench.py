@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Concurrent load benchmark for the contact API.
+Drives a configurable mix of POST and GET /api/contact either against the
+ASGI app in-process or against a running uvicorn, and reports RPS and
+p50/p95/p99 latency. In-process runs use the in-memory contact store by
+default, which isolates the HTTP and serialisation cost from Mongo.
+
+A JSON baseline can be recorded and later used to fail a run that
+regresses beyond a tolerance. Baselines only mean something on the
+machine that recorded them; re-record with --write-baseline before
+comparing elsewhere. p99 is only flagged once it is over the baseline by
+both the relative tolerance and --p99-floor-ms, since sub-millisecond
+in-memory latencies otherwise fail on scheduler noise alone.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def contact_payload(i):
+    return {
+        "name": f"Load Test {i}",
+        "email": f"load{i}@example.com",
+        "project": random.choice(["Web Development", "Mobile App", "Consulting"]),
+        "message": "Benchmark submission " * 5,
+    }
+
+
+@asynccontextmanager
+async def open_client(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            yield client
+        return
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    if args.store == "memory":
+        os.environ["CONTACT_STORE"] = "memory"
+    elif args.store == "mock":
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "load_bench")
+    import server
+
+    if args.store == "mock":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--store mock needs mongomock-motor (pip install -r benchmarks/requirements.txt)")
+        server.create_mongo_client = AsyncMongoMockClient
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            yield client
+
+
+async def run(args):
+    latencies = {"post": [], "get": []}
+    errors = {"post": 0, "get": 0}
+    remaining = args.requests
+
+    async with open_client(args) as client:
+        for i in range(args.seed_rows):
+            await client.post("/api/contact", json=contact_payload(i))
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                op = "post" if random.random() < args.post_ratio else "get"
+                started = time.perf_counter()
+                try:
+                    if op == "post":
+                        response = await client.post("/api/contact", json=contact_payload(remaining))
+                    else:
+                        response = await client.get("/api/contact", params={"limit": args.page_size})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[op].append(time.perf_counter() - started)
+                else:
+                    errors[op] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    report = {op: summarise(latencies[op], errors[op], elapsed) for op in latencies}
+    report["total"] = summarise(latencies["post"] + latencies["get"], sum(errors.values()), elapsed)
+    return report
+
+
+def compare(report, baseline, tolerance, p99_floor_ms=0.0):
+    failures = []
+    for op, expected in baseline.items():
+        actual = report.get(op)
+        if not actual or not actual["requests"]:
+            continue
+        if actual["rps"] < expected["rps"] * (1 - tolerance):
+            failures.append(f"{op}: rps {actual['rps']:.1f} < baseline {expected['rps']:.1f}")
+        limit = max(expected["p99_ms"] * (1 + tolerance), expected["p99_ms"] + p99_floor_ms)
+        if actual["p99_ms"] > limit:
+            failures.append(f"{op}: p99 {actual['p99_ms']:.2f}ms > baseline {expected['p99_ms']:.2f}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; in-process ASGI when omitted")
+    parser.add_argument("--store", choices=["memory", "mock", "env"], default="memory",
+                        help="In-process only: in-memory contact store, mongomock stand-in "
+                             "or the MONGO_URL from backend/.env")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--post-ratio", type=float, default=0.2)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed-rows", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", type=Path, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--p99-floor-ms", type=float, default=5.0,
+                        help="Smallest p99 increase over the baseline, in ms, that counts as a regression")
+    parser.add_argument("--write-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    report = asyncio.run(run(args))
+    for op, stats in report.items():
+        print(
+            f"{op:>5}: {stats['requests']:6d} ok {stats['errors']:4d} err "
+            f"{stats['rps']:9.1f} rps  p50 {stats['p50_ms']:7.2f}ms  "
+            f"p95 {stats['p95_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms"
+        )
+
+    if args.baseline and args.write_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        failures = compare(report, json.loads(args.baseline.read_text()), args.tolerance, args.p99_floor_ms)
+        if failures:
+            print("Performance regression:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("Within baseline tolerance")
+
+
+if __name__ == "__main__":
+    main()
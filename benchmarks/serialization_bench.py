@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the GET /api/contact read path.
+Compares the old per-row ContactMessage validation plus response_model
+re-validation against the projected orjson fast path.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from server import ContactMessage, ContactMessagePage, render_contact_page  # noqa: E402
+
+
+def make_documents(count):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Client {i}",
+            "email": f"client{i}@example.com",
+            "project": "Web Development",
+            "message": "Hello, I would like to discuss a new project. " * 4,
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+page_adapter = TypeAdapter(ContactMessagePage)
+
+
+def old_path(documents, limit):
+    # Mirrors the previous handler: ContactMessage per row, then FastAPI
+    # validates and serialises the whole response_model again
+    page = ContactMessagePage(items=[ContactMessage(**d) for d in documents[:limit]], next_cursor=None)
+    content = page_adapter.dump_python(page_adapter.validate_python(page), mode="json")
+    return json.dumps(content).encode()
+
+
+def fast_path(documents, limit):
+    return render_contact_page(documents, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = make_documents(args.rows)
+    results = {}
+    for name, fn in (("old", old_path), ("fast", fast_path)):
+        # Fresh copies so neither path benefits from the other's mutations
+        timings = timeit.repeat(
+            lambda: fn([dict(d) for d in documents], args.rows),
+            number=args.number,
+            repeat=args.repeat,
+        )
+        results[name] = min(timings) / args.number * 1e6
+        print(f"{name:>5}: {results[name]:.1f} us per page of {args.rows} rows")
+    print(f"speedup: {results['old'] / results['fast']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
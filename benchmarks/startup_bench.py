@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for server workers.
+Runs each measurement in a fresh interpreter and reports the time to
+import server.py, to finish the lifespan startup and to serve the first
+request, plus a per-module import-time breakdown from -X importtime.
+A JSON baseline can be recorded and later used to fail a slower run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+PHASES = ("import_ms", "lifespan_ms", "first_request_ms", "total_ms", "process_ms")
+
+
+def child(store):
+    # Harness imports, like asyncio and httpx above, happen before timing starts
+    if store == "mock":
+        from mongomock_motor import AsyncMongoMockClient
+    started = time.perf_counter()
+    sys.path.insert(0, str(BACKEND_DIR))
+    if store == "memory":
+        os.environ["CONTACT_STORE"] = "memory"
+    import server
+    imported = time.perf_counter()
+
+    if store == "mock":
+        server.create_mongo_client = AsyncMongoMockClient
+
+    async def serve_first_request():
+        async with server.app.router.lifespan_context(server.app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.get("/api/")
+                response.raise_for_status()
+            return ready, time.perf_counter()
+
+    ready, served = asyncio.run(serve_first_request())
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "lifespan_ms": (ready - imported) * 1000,
+        "first_request_ms": (served - ready) * 1000,
+        "total_ms": (served - started) * 1000,
+    }))
+
+
+def measure(store):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--store", store],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def import_breakdown(top):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": str(BACKEND_DIR)},
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Names are indented two spaces per nesting level after "| "
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()[1:]))
+    direct = [row for row in rows if row[2].startswith("  ") and not row[2].startswith("   ")]
+    return {
+        "by_self": [(name.strip(), us / 1000) for us, _, name in sorted(rows, reverse=True)[:top]],
+        "server_imports": [(name.strip(), cum / 1000) for _, cum, name in sorted(direct, key=lambda r: -r[1])[:top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--store", choices=["memory", "mock", "env"], default="memory",
+                        help="In-memory contact store, mongomock stand-in or the MONGO_URL from backend/.env")
+    parser.add_argument("--top", type=int, default=12, help="Modules to list in the import breakdown")
+    parser.add_argument("--baseline", type=Path, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--write-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.store)
+        return
+
+    # Warm-up run so .pyc compilation is not counted
+    measure(args.store)
+    runs = [measure(args.store) for _ in range(args.runs)]
+    report = {phase: statistics.median(run[phase] for run in runs) for phase in PHASES}
+    for phase in PHASES:
+        print(f"{phase:>17}: {report[phase]:8.1f} ms (median of {args.runs})")
+
+    breakdown = import_breakdown(args.top)
+    print("\nSlowest modules (self time):")
+    for name, ms in breakdown["by_self"]:
+        print(f"  {ms:8.1f} ms  {name}")
+    print("\nserver.py imports (cumulative):")
+    for name, ms in breakdown["server_imports"]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if args.baseline and args.write_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+    elif args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        failures = [
+            f"{phase}: {report[phase]:.1f}ms > baseline {baseline[phase]:.1f}ms"
+            for phase in PHASES
+            if phase in baseline and report[phase] > baseline[phase] * (1 + args.tolerance)
+        ]
+        if failures:
+            print("\nStartup regression:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("\nWithin baseline tolerance")
+
+
+if __name__ == "__main__":
+    main()
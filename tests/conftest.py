@@ -0,0 +1,39 @@
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# The backend imports its sibling modules flat, as when run from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ["CONTACT_STORE"] = "memory"
+os.environ.setdefault("CONTACT_RETENTION_DAYS", "0")
+os.environ["BULK_IMPORT_TOKEN"] = "test-bulk-token"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    # Each client gets a fresh in-memory store from the lifespan; the
+    # module-level caches outlive it, so start those empty too
+    server.invalidate_contact_cache()
+    server.idempotency_cache.invalidate()
+    with TestClient(server.app) as client:
+        yield client
+
+
+def contact(n: int, project: str = "web") -> dict:
+    return {
+        "name": f"Sender {n}",
+        "email": f"sender{n}@example.com",
+        "project": project,
+        "message": f"Message number {n}",
+    }
+
+
+def stored(n: int, created_at: datetime, project: str = "web") -> dict:
+    return {"id": f"msg-{n:02d}", **contact(n, project), "created_at": created_at}
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+from bulk_import import JSONArraySplitter, iter_json_array, iter_ndjson
+
+RECORDS = [
+    {"name": "Ada", "message": "plain"},
+    {"name": "Brackets ] } [ {", "message": "a, b, c"},
+    {"name": "Quote \" and backslash \\", "message": "ends with \\"},
+    {"name": "Nested", "tags": [{"a": [1, 2]}, {"b": {"c": "]"}}]},
+    {"name": "Unicode é中", "message": "line\nbreak\ttab"},
+    [1, "two", None],
+    "a bare string, with a comma",
+    42,
+]
+BODY = b' \n[ ' + b' ,\n'.join(json.dumps(r).encode() for r in RECORDS) + b' ]\n'
+
+
+def split(chunks):
+    splitter = JSONArraySplitter()
+    elements = []
+    for chunk in chunks:
+        elements += splitter.feed(chunk)
+    splitter.finish()
+    return [json.loads(element) for element in elements]
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_whole_body():
+    assert split([BODY]) == RECORDS
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16])
+def test_fixed_size_chunks(size):
+    assert split(chunked(BODY, size)) == RECORDS
+
+
+def test_every_two_way_split():
+    # Covers a cut inside strings, right after a backslash and between
+    # the bytes of a multi-byte character
+    for cut in range(len(BODY) + 1):
+        assert split([BODY[:cut], BODY[cut:]]) == RECORDS, cut
+
+
+def test_empty_array():
+    assert split(chunked(b"  [ \n ] ", 1)) == []
+
+
+def test_empty_elements_are_handed_on():
+    splitter = JSONArraySplitter()
+    assert splitter.feed(b"[1,,2]") == [b"1", b"", b"2"]
+
+
+def test_whitespace_after_the_array_is_allowed():
+    splitter = JSONArraySplitter()
+    assert splitter.feed(b"[1] \n") == [b"1"]
+    assert splitter.feed(b"\r\n\t ") == []
+    splitter.finish()
+
+
+@pytest.mark.parametrize("body, error", [
+    (b'[{"a":1},]', "Trailing comma"),
+    (b'[{"a":1} , \n]', "Trailing comma"),
+    (b'[{"a":1}] garbage', "after the JSON array"),
+    (b'[{"a":1}][{"b":2}]', "after the JSON array"),
+])
+def test_malformed_endings_raise_after_the_valid_elements(body, error):
+    for size in (1, 3, len(body)):
+        splitter = JSONArraySplitter()
+        elements = []
+        with pytest.raises(ValueError, match=error):
+            for chunk in chunked(body, size):
+                elements += splitter.feed(chunk)
+            splitter.finish()
+        assert elements == [b'{"a":1}'], size
+
+
+def test_body_that_is_not_an_array():
+    with pytest.raises(ValueError, match="JSON array"):
+        JSONArraySplitter().feed(b' {"name": "x"}')
+
+
+def test_unterminated_array():
+    splitter = JSONArraySplitter()
+    assert splitter.feed(b'[{"a": 1}, {"b": "]') == [b'{"a": 1}']
+    with pytest.raises(ValueError, match="Unterminated"):
+        splitter.finish()
+
+
+def test_buffer_only_holds_the_unfinished_element():
+    splitter = JSONArraySplitter()
+    for record in RECORDS[:3]:
+        splitter.feed(b"[" if not splitter.opened else b",")
+        splitter.feed(json.dumps(record).encode())
+    assert bytes(splitter.buffer) == json.dumps(RECORDS[2]).encode()
+
+
+async def stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(records):
+    return [(index, record) async for index, record in records]
+
+
+def test_iter_json_array_parses_each_element():
+    records = asyncio.run(collect(iter_json_array(stream(chunked(b'[{"a": 1}, {oops}, 3]', 4)))))
+
+    assert [index for index, _ in records] == [0, 1, 2]
+    assert records[0][1] == {"a": 1}
+    assert isinstance(records[1][1], ValueError)
+    assert records[2][1] == 3
+
+
+def test_iter_ndjson_joins_lines_across_chunks():
+    body = b'{"a": 1}\n\n{"b": "x\\ny"}\r\n{bad\n{"c": 3}'
+    for size in (1, 5, len(body)):
+        records = asyncio.run(collect(iter_ndjson(stream(chunked(body, size)))))
+        assert [index for index, _ in records] == [0, 1, 2, 3]
+        assert records[0][1] == {"a": 1}
+        assert records[1][1] == {"b": "x\ny"}
+        assert isinstance(records[2][1], ValueError)
+        assert records[3][1] == {"c": 3}
@@ -0,0 +1,229 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+from contact_repository import MemoryContactRepository
+from load_shedding import LoadShedder
+from tests.conftest import contact, stored
+
+BASE = datetime(2024, 3, 1, 12, 0, 0)
+BULK_AUTH = {"Authorization": "Bearer test-bulk-token"}
+
+
+def seed(client, documents):
+    client.portal.call(server.contacts.insert_many, documents)
+
+
+def cursor_for(created_at: str, message_id: str) -> str:
+    payload = json.dumps({"created_at": created_at, "id": message_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def all_pages(client, limit: int):
+    ids, after = [], None
+    while True:
+        params = {"limit": limit} if after is None else {"limit": limit, "after": after}
+        response = client.get("/api/contact", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            return ids
+
+
+def test_keyset_pages_cover_every_message_once_with_ties(client):
+    # Three messages share a timestamp, so the id has to break the tie
+    documents = [stored(n, BASE + timedelta(seconds=n // 3)) for n in range(8)]
+    seed(client, documents)
+    expected = [d["id"] for d in sorted(documents, key=lambda d: (d["created_at"], d["id"]), reverse=True)]
+
+    for limit in (1, 2, 3, 8, 100):
+        assert all_pages(client, limit) == expected
+
+
+def test_offset_aware_cursor_matches_naive_cursor(client):
+    documents = [stored(n, BASE + timedelta(minutes=n)) for n in range(5)]
+    seed(client, documents)
+    pivot = documents[3]
+    naive = client.get("/api/contact", params={"after": cursor_for(pivot["created_at"].isoformat(), pivot["id"])})
+    expected = [item["id"] for item in naive.json()["items"]]
+    assert expected == ["msg-02", "msg-01", "msg-00"]
+
+    for created_at in (
+        pivot["created_at"].replace(tzinfo=timezone.utc).isoformat(),
+        pivot["created_at"].replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=2))).isoformat(),
+    ):
+        response = client.get("/api/contact", params={"after": cursor_for(created_at, pivot["id"])})
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()["items"]] == expected
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/contact", params={"after": "not-a-cursor"}).status_code == 400
+
+
+def test_export_since_accepts_utc_designator(client):
+    seed(client, [stored(n, BASE + timedelta(hours=n)) for n in range(4)])
+    since = (BASE + timedelta(hours=2)).isoformat() + "Z"
+
+    response = client.get("/api/contact/export", params={"since": since})
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["id"] for row in rows) == ["msg-02", "msg-03"]
+
+
+def test_idempotent_replay_returns_the_original_message(client):
+    headers = {"Idempotency-Key": "form-submit-1"}
+    first = client.post("/api/contact", json=contact(1), headers=headers)
+    replay = client.post("/api/contact", json=contact(2), headers=headers)
+    assert first.status_code == replay.status_code == 200
+    assert replay.json() == first.json()
+
+    # Past the in-process cache, the unique index answers the replay
+    server.idempotency_cache.invalidate()
+    replay = client.post("/api/contact", json=contact(3), headers=headers)
+    assert replay.json() == first.json()
+
+    items = client.get("/api/contact").json()["items"]
+    assert [item["id"] for item in items] == [first.json()["id"]]
+
+
+def test_bulk_ndjson_import_reports_partial_failures(client):
+    lines = [
+        json.dumps(contact(1)),
+        "{not json",
+        json.dumps({"name": "No email", "project": "web", "message": "hi"}),
+        "[1, 2]",
+        "",
+        json.dumps(contact(2)),
+    ]
+    response = client.post(
+        "/api/contact/bulk",
+        content="\n".join(lines).encode(),
+        headers={"Content-Type": "application/x-ndjson", **BULK_AUTH},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["received"], result["inserted"], result["failed"]) == (5, 2, 3)
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3]
+    assert result["errors"][0]["error"].startswith("Invalid JSON")
+    assert "email" in result["errors"][1]["error"]
+    assert result["errors"][2]["error"] == "Record must be a JSON object"
+    assert len(client.get("/api/contact").json()["items"]) == 2
+
+
+def test_bulk_array_import_keeps_records_before_a_truncated_body(client):
+    # The last element is never closed, so only the first one is imported
+    body = json.dumps([contact(1), contact(2)])[:-1]
+    response = client.post("/api/contact/bulk", content=body.encode(), headers={"Content-Type": "application/json", **BULK_AUTH})
+
+    result = response.json()
+    assert (result["received"], result["inserted"], result["failed"]) == (1, 1, 1)
+    assert result["errors"][0] == {"index": 1, "error": "Unterminated JSON array"}
+    assert len(client.get("/api/contact").json()["items"]) == 1
+
+
+def test_bulk_array_import_reports_data_after_the_array(client):
+    body = json.dumps([contact(1)]) + json.dumps([contact(2)])
+    response = client.post("/api/contact/bulk", content=body.encode(), headers={"Content-Type": "application/json", **BULK_AUTH})
+
+    result = response.json()
+    assert (result["received"], result["inserted"], result["failed"]) == (1, 1, 1)
+    assert result["errors"][0] == {"index": 1, "error": "Unexpected data after the JSON array"}
+
+
+def test_bulk_import_needs_the_admin_token(client, monkeypatch):
+    body = json.dumps([contact(1)]).encode()
+
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "test-bulk-token"}):
+        response = client.post("/api/contact/bulk", content=body, headers=headers)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    monkeypatch.setattr(server, "BULK_IMPORT_TOKEN", None)
+    assert client.post("/api/contact/bulk", content=body, headers=BULK_AUTH).status_code == 403
+    assert client.get("/api/contact").json()["items"] == []
+
+
+def test_bulk_import_goes_through_admission_control(client, monkeypatch):
+    monkeypatch.setattr(server, "contact_shedder", LoadShedder(rate=0.01))
+    body = json.dumps([contact(1)]).encode()
+
+    assert client.post("/api/contact/bulk", content=body, headers=BULK_AUTH).status_code == 200
+    response = client.post("/api/contact/bulk", content=body, headers=BULK_AUTH)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert server.contact_shedder.in_flight == 0
+
+
+def test_bulk_import_stays_off_the_live_feed(client):
+    subscription = server.contact_feed.subscribe()
+    try:
+        body = json.dumps([contact(n) for n in range(server.contact_feed.max_queue + 10)]).encode()
+        result = client.post("/api/contact/bulk", content=body, headers=BULK_AUTH).json()
+        assert result["inserted"] == server.contact_feed.max_queue + 10
+        assert not subscription.lagged and subscription.queue.empty()
+
+        posted = client.post("/api/contact", json=contact(0)).json()
+        assert subscription.queue.get_nowait()["id"] == posted["id"]
+    finally:
+        server.contact_feed.unsubscribe(subscription)
+
+    # The marker is storage-only
+    items = client.get("/api/contact", params={"limit": 5}).json()["items"]
+    assert all(set(item) == set(posted) for item in items)
+
+
+def test_bulk_insert_reports_duplicates_and_keeps_the_rest():
+    repository = MemoryContactRepository()
+    documents = [stored(n, BASE) for n in range(3)]
+
+    async def insert_twice():
+        await repository.insert_many(documents[:1])
+        await repository.insert_many(documents)
+
+    with pytest.raises(BulkWriteError) as e:
+        asyncio.run(insert_twice())
+
+    assert [(error["index"], error["code"]) for error in e.value.details["writeErrors"]] == [(0, 11000)]
+    assert sorted(repository.documents) == ["msg-00", "msg-01", "msg-02"]
+
+
+def test_stats_count_posted_and_imported_messages(client):
+    for n in range(3):
+        client.post("/api/contact", json=contact(n, "web"))
+    client.post(
+        "/api/contact/bulk",
+        content=json.dumps([contact(3, "app"), contact(4, "app"), {"name": "broken"}]).encode(),
+        headers={"Content-Type": "application/json", **BULK_AUTH},
+    )
+    today = datetime.utcnow().date()
+
+    stats = client.get("/api/contact/stats").json()
+    assert stats == {"total": 5, "by_project": {"web": 3, "app": 2}, "by_day": {today.isoformat(): 5}}
+
+    tomorrow = (today + timedelta(days=1)).isoformat()
+    assert client.get("/api/contact/stats", params={"since": tomorrow}).json()["total"] == 0
+
+
+def test_stats_etag_follows_the_rollups(client):
+    client.post("/api/contact", json=contact(1))
+    first = client.get("/api/contact/stats")
+    etag = first.headers["ETag"]
+    assert client.get("/api/contact/stats", headers={"If-None-Match": etag}).status_code == 304
+
+    # A rollup update with no new message, as from a backfill
+    client.portal.call(server.contacts.record_stats, [stored(2, datetime.utcnow(), "app")])
+
+    response = client.get("/api/contact/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["by_project"] == {"web": 1, "app": 1}
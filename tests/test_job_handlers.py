@@ -0,0 +1,45 @@
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import job_handlers
+
+
+@pytest.fixture
+def webhook():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/crm", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_crm_push_sends_iso_timestamps(webhook):
+    url, received = webhook
+    message = {"id": "m1", "name": "Ada", "created_at": datetime(2026, 10, 18, 1, 26, 17, 123000)}
+
+    job_handlers._post_json(url, message)
+
+    assert received == [{"id": "m1", "name": "Ada", "created_at": "2026-10-18T01:26:17.123000"}]
+
+
+def test_spam_score():
+    message = {"name": "Ada", "project": "web", "message": "Cheap casino loan at http://x http://y"}
+
+    assert job_handlers.spam_score(message) == 1.0
+    assert job_handlers.spam_score({"name": "Ada", "project": "web", "message": "Hello there"}) == 0.0
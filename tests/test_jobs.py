@@ -0,0 +1,267 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import dev_sinks
+import job_handlers
+from contact_repository import MemoryContactRepository, public_fields
+from jobs import DONE, FAILED, PENDING, RUNNING, JobOutbox, JobQueue
+from tests.conftest import stored
+
+
+def job_collection():
+    return AsyncMongoMockClient()["test"]["jobs"]
+
+
+async def expire_lease(collection, job_id):
+    # As if the worker holding the job died and its lease ran out
+    await collection.update_one({"_id": job_id}, {"$set": {"available_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_job_that_keeps_killing_its_worker_is_failed_after_max_attempts():
+    async def run():
+        collection = job_collection()
+        queue = JobQueue(collection, {}, max_attempts=2)
+        await queue.enqueue_many([("crash", {})], ids=["job-1"])
+
+        for attempt in (1, 2):
+            job = await queue.claim()
+            assert (job["_id"], job["status"], job["attempts"]) == ("job-1", RUNNING, attempt)
+            await expire_lease(collection, "job-1")
+
+        assert await queue.claim() is None
+        assert await queue.fail_abandoned() == 1
+        job = await collection.find_one({"_id": "job-1"})
+        assert (job["status"], job["attempts"]) == (FAILED, 2)
+        assert "available_at" not in job and job["finished_at"]
+
+    asyncio.run(run())
+
+
+def test_running_job_within_its_lease_is_left_alone():
+    async def run():
+        collection = job_collection()
+        queue = JobQueue(collection, {}, max_attempts=1)
+        await queue.enqueue_many([("slow", {})], ids=["job-1"])
+        await queue.claim()
+
+        assert await queue.claim() is None
+        assert await queue.fail_abandoned() == 0
+        assert (await collection.find_one({"_id": "job-1"}))["status"] == RUNNING
+
+    asyncio.run(run())
+
+
+async def run_claimed(queue, job_id):
+    job = await queue.claim()
+    assert job["_id"] == job_id
+    await queue._run(job)
+    return await queue.collection.find_one({"_id": job_id})
+
+
+def test_failed_attempts_back_off_then_fail():
+    async def run():
+        collection = job_collection()
+        errors = []
+
+        async def flaky(payload):
+            errors.append(payload)
+            raise RuntimeError("webhook down")
+
+        queue = JobQueue(collection, {"crm_push": flaky}, max_attempts=3, backoff_base=4.0)
+        await queue.enqueue_many([("crm_push", {"id": "m1"})], ids=["job-1"])
+
+        for attempt in (1, 2):
+            before = datetime.utcnow()
+            job = await run_claimed(queue, "job-1")
+            assert (job["status"], job["attempts"]) == (PENDING, attempt)
+            assert job["last_error"] == "RuntimeError('webhook down')"
+            delay = (job["available_at"] - before).total_seconds()
+            assert 4.0 ** attempt * 0.5 - 0.1 <= delay <= 4.0 ** attempt + 0.1
+            # Not claimable until the backoff has passed
+            assert await queue.claim() is None
+            await collection.update_one({"_id": "job-1"}, {"$set": {"available_at": datetime.utcnow()}})
+
+        job = await run_claimed(queue, "job-1")
+        assert (job["status"], job["attempts"]) == (FAILED, 3)
+        assert "finished_at" in job
+        assert errors == [{"id": "m1"}] * 3
+
+    asyncio.run(run())
+
+
+def test_backoff_is_capped_and_jittered():
+    queue = JobQueue(job_collection(), {}, backoff_base=2.0, backoff_max=30.0)
+
+    delays = [queue.backoff(3) for _ in range(50)]
+    assert all(4.0 <= delay <= 8.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert all(15.0 <= queue.backoff(20) <= 30.0 for _ in range(50))
+
+
+def test_successful_job_is_done_and_unknown_kinds_fail():
+    async def run():
+        collection = job_collection()
+        seen = []
+
+        async def handler(payload):
+            seen.append(payload)
+
+        queue = JobQueue(collection, {"spam_score": handler}, max_attempts=1)
+        await queue.enqueue_many([("spam_score", {"id": "m1"})], ids=["job-1"])
+        await queue.enqueue_many([("retired_kind", {"id": "m1"})], ids=["job-2"], delay=0.001)
+        await asyncio.sleep(0.002)
+
+        job = await run_claimed(queue, "job-1")
+        assert job["status"] == DONE and "available_at" not in job
+        assert seen == [{"id": "m1"}]
+        job = await run_claimed(queue, "job-2")
+        assert job["status"] == FAILED
+        assert "No handler for job kind 'retired_kind'" in job["last_error"]
+
+    asyncio.run(run())
+
+
+def test_lease_hides_a_running_job_until_it_expires():
+    async def run():
+        collection = job_collection()
+        first = JobQueue(collection, {}, lease=30)
+        second = JobQueue(collection, {}, lease=30)
+        second.worker_id = "other-host:1"
+        await first.enqueue_many([("crm_push", {})], ids=["job-1"])
+
+        before = datetime.utcnow()
+        job = await first.claim()
+        assert job["worker"] == first.worker_id
+        assert timedelta(seconds=29) < job["available_at"] - before <= timedelta(seconds=31)
+        assert await second.claim() is None
+
+        await expire_lease(collection, "job-1")
+        job = await second.claim()
+        assert (job["worker"], job["attempts"]) == ("other-host:1", 2)
+
+    asyncio.run(run())
+
+
+def test_shutdown_hands_the_job_back_without_counting_the_attempt():
+    async def run():
+        collection = job_collection()
+        started = asyncio.Event()
+
+        async def slow(payload):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue = JobQueue(collection, {"slow": slow}, poll_interval=0.01)
+        await queue.enqueue_many([("slow", {})], ids=["job-1"])
+        queue.start()
+        await asyncio.wait_for(started.wait(), 5)
+        await queue.stop()
+
+        job = await collection.find_one({"_id": "job-1"})
+        assert (job["status"], job["attempts"]) == (PENDING, 0)
+        assert job["available_at"] <= datetime.utcnow()
+
+    asyncio.run(run())
+
+
+def test_enqueue_with_ids_skips_jobs_already_queued():
+    async def run():
+        collection = job_collection()
+        queue = JobQueue(collection, {})
+        await queue.enqueue_many([("a", {"n": 1}), ("b", {"n": 1})], ids=["m1:a", "m1:b"])
+        await queue.enqueue_many([("a", {"n": 2}), ("c", {"n": 2})], ids=["m1:a", "m1:c"])
+
+        jobs = {job["_id"]: job async for job in collection.find({})}
+        assert sorted(jobs) == ["m1:a", "m1:b", "m1:c"]
+        assert jobs["m1:a"]["payload"] == {"n": 1}
+
+    asyncio.run(run())
+
+
+def stored_message(n: int, pending_jobs) -> dict:
+    return stored(n, datetime(2024, 3, 1, 12, 0, n)) | {"pending_jobs": pending_jobs}
+
+
+def test_outbox_relays_each_job_once():
+    async def run():
+        contacts = MemoryContactRepository()
+        collection = job_collection()
+        queue = JobQueue(collection, {})
+        outbox = JobOutbox(contacts, queue, public_fields, batch_size=2)
+        await contacts.insert_many([stored_message(n, ["notify_email", "spam_score"]) for n in range(5)])
+
+        assert await outbox.relay() == 5
+        assert await contacts.pending_jobs(10) == []
+        assert "pending_jobs" not in contacts.documents["msg-00"]
+        jobs = [job async for job in collection.find({}).sort("_id", 1)]
+        assert [job["_id"] for job in jobs[:2]] == ["msg-00:notify_email", "msg-00:spam_score"]
+        assert len(jobs) == 10
+        # The payload is the public message, without the outbox field
+        assert jobs[0]["payload"] == public_fields(contacts.documents["msg-00"])
+
+        assert await outbox.relay() == 0
+        assert await collection.count_documents({}) == 10
+
+    asyncio.run(run())
+
+
+def test_outbox_relay_interrupted_before_clearing_does_not_duplicate_jobs():
+    async def run():
+        contacts = MemoryContactRepository()
+        collection = job_collection()
+        outbox = JobOutbox(contacts, JobQueue(collection, {}), public_fields)
+        await contacts.insert(stored_message(0, ["crm_push"]))
+
+        async def crash(message_ids):
+            raise ConnectionError("primary stepped down")
+
+        contacts.clear_pending_jobs, clear = crash, contacts.clear_pending_jobs
+        with pytest.raises(ConnectionError):
+            await outbox.relay()
+        contacts.clear_pending_jobs = clear
+
+        # A second worker's relay picks the message up again
+        assert await outbox.relay() == 1
+        assert [job["_id"] async for job in collection.find({})] == ["msg-00:crm_push"]
+
+    asyncio.run(run())
+
+
+def test_outbox_and_queue_deliver_through_the_dev_sinks(monkeypatch, tmp_path):
+    async def run():
+        recorder = dev_sinks.Recorder(str(tmp_path / "sinks.jsonl"))
+        smtp = await asyncio.start_server(lambda r, w: dev_sinks.handle_smtp(r, w, recorder), "127.0.0.1", 0)
+        http = await asyncio.start_server(lambda r, w: dev_sinks.handle_http(r, w, recorder, 0.0), "127.0.0.1", 0)
+        monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+        monkeypatch.setenv("SMTP_PORT", str(smtp.sockets[0].getsockname()[1]))
+        monkeypatch.setenv("NOTIFY_EMAIL_TO", "admin@localhost")
+        monkeypatch.setenv("CRM_WEBHOOK_URL", f"http://127.0.0.1:{http.sockets[0].getsockname()[1]}/crm")
+
+        contacts = MemoryContactRepository()
+        collection = job_collection()
+        queue = JobQueue(collection, job_handlers.build_handlers(contacts), concurrency=2, poll_interval=0.01)
+        outbox = JobOutbox(contacts, queue, public_fields, poll_interval=0.01)
+        await contacts.insert(stored_message(0, job_handlers.enabled_kinds()))
+        async with smtp, http:
+            queue.start()
+            outbox.start()
+            try:
+                for _ in range(500):
+                    if await collection.count_documents({"status": DONE}) == 3:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                await outbox.stop()
+                await queue.stop()
+
+        assert await collection.count_documents({"status": DONE}) == 3
+        assert contacts.documents["msg-00"]["spam_score"] == 0.0
+        received = {entry["kind"]: entry for entry in map(json.loads, (tmp_path / "sinks.jsonl").read_text().splitlines())}
+        assert "Subject: New contact message from Sender 0" in received["smtp"]["data"]
+        assert json.loads(received["http"]["body"])["created_at"] == "2024-03-01T12:00:00"
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import os
+
+import serve
+from listing_cache import FileInvalidationNotifier, ListingCache
+
+
+def test_invalidation_reaches_caches_sharing_a_notifier_file(tmp_path):
+    path = tmp_path / "contact-cache"
+    worker_a = ListingCache(ttl=60, notifier=FileInvalidationNotifier(path))
+    worker_b = ListingCache(ttl=60, notifier=FileInvalidationNotifier(path))
+    worker_a.set("page", "before")
+    worker_b.set("page", "before")
+
+    worker_b.invalidate()
+
+    assert worker_a.get("page") is None
+    assert worker_b.get("page") is None
+
+
+def test_result_read_before_an_invalidation_is_not_cached():
+    cache = ListingCache(ttl=60)
+    generation = cache.generation
+    cache.invalidate()
+
+    cache.set("page", "stale", generation)
+
+    assert cache.get("page") is None
+
+
+def test_serve_shares_a_notifier_file_between_workers(monkeypatch):
+    started = {}
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **kwargs: started.update(kwargs))
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.delenv("CONTACT_CACHE_NOTIFY_FILE", raising=False)
+
+    serve.main()
+
+    assert started["workers"] == 4
+    assert os.environ["CONTACT_CACHE_NOTIFY_FILE"]
+
+
+def test_serve_keeps_a_configured_notifier_file(monkeypatch):
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **kwargs: None)
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    monkeypatch.setenv("CONTACT_CACHE_NOTIFY_FILE", "/var/run/contact-cache")
+
+    serve.main()
+
+    assert os.environ["CONTACT_CACHE_NOTIFY_FILE"] == "/var/run/contact-cache"
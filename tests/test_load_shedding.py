@@ -0,0 +1,70 @@
+import pytest
+
+import load_shedding
+from load_shedding import LoadShedder
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(load_shedding.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_client_rate_below_one_per_second_admits_one_request_per_interval(clock):
+    shedder = LoadShedder(client_rate=0.2)
+
+    assert shedder.try_acquire("a") is None
+    shedder.release()
+    rejection = shedder.try_acquire("a")
+    assert (rejection.status_code, rejection.retry_after) == (429, 5)
+    # Other clients have their own bucket
+    assert shedder.try_acquire("b") is None
+    shedder.release()
+
+    clock[0] += 5
+    assert shedder.try_acquire("a") is None
+
+
+def test_global_rate_below_one_per_second_admits_requests(clock):
+    shedder = LoadShedder(rate=0.5)
+
+    assert shedder.try_acquire("a") is None
+    shedder.release()
+    assert shedder.try_acquire("b").status_code == 503
+    clock[0] += 2
+    assert shedder.try_acquire("b") is None
+
+
+def test_burst_allows_that_many_requests_at_once(clock):
+    shedder = LoadShedder(client_rate=1, client_burst=3)
+
+    for _ in range(3):
+        assert shedder.try_acquire("a") is None
+        shedder.release()
+    assert shedder.try_acquire("a").status_code == 429
+
+
+@pytest.mark.parametrize("kwargs", [{"rate": 1, "burst": 0.5}, {"client_rate": 1, "client_burst": 0.5}])
+def test_burst_below_one_is_rejected(kwargs):
+    with pytest.raises(ValueError, match="at least 1"):
+        LoadShedder(**kwargs)
+
+
+def test_in_flight_cap(clock):
+    shedder = LoadShedder(max_in_flight=2)
+
+    assert shedder.try_acquire("a") is None
+    assert shedder.try_acquire("b") is None
+    assert shedder.try_acquire("c") == (503, "Server busy", 1)
+    shedder.release()
+    assert shedder.try_acquire("c") is None
+
+
+def test_client_buckets_are_bounded(clock):
+    shedder = LoadShedder(client_rate=1, max_clients=2)
+
+    for client in ("a", "b", "c"):
+        assert shedder.try_acquire(client) is None
+        shedder.release()
+    assert list(shedder._clients) == ["b", "c"]
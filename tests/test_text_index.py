@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from text_index import InvertedIndex
+
+T = datetime(2024, 3, 1, 12, 0, 0)
+
+
+def message(message_id: str, text: str, created_at: datetime) -> dict:
+    return {"id": message_id, "name": "Sender", "message": text, "created_at": created_at}
+
+
+async def search(index, collection, q):
+    await index.sync(collection)
+    return [doc_id for _, _, doc_id in index.search(q, 10)]
+
+
+def test_sync_picks_up_a_message_stored_after_a_newer_one():
+    async def run():
+        collection = AsyncMongoMockClient()["test"]["contact_messages"]
+        index = InvertedIndex(["name", "message"], {"message": 2})
+        await collection.insert_one(message("a", "banana", T))
+        assert await search(index, collection, "banana") == ["a"]
+
+        # Stamped before "a" but written after it was indexed
+        await collection.insert_one(message("b", "cherry", T - timedelta(milliseconds=20)))
+        assert await search(index, collection, "cherry") == ["b"]
+        assert await search(index, collection, "banana") == ["a"]
+        assert len(index.created) == 2
+
+    asyncio.run(run())
+
+
+def test_sync_does_not_look_back_further_than_the_overlap():
+    async def run():
+        collection = AsyncMongoMockClient()["test"]["contact_messages"]
+        index = InvertedIndex(["message"])
+        await collection.insert_one(message("a", "banana", T))
+        await index.sync(collection)
+        await collection.insert_one(message("b", "cherry", T - timedelta(hours=1)))
+
+        await index.sync(collection, overlap=timedelta(minutes=1))
+
+        assert "b" not in index.created
+
+    asyncio.run(run())
+
+
+def test_removed_documents_leave_the_postings():
+    index = InvertedIndex(["message"])
+    document = message("a", "banana split", T)
+    index.add(document)
+    index.remove(document)
+
+    assert index.search("banana", 10) == []
+    assert not index.postings